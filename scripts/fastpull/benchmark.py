@@ -4,15 +4,36 @@ Benchmarking utilities for fastpull run command.
 Tracks container lifecycle events and readiness checks.
 """
 
+import asyncio
 import json
+import random
+import re
 import subprocess
-import threading
 import time
+import uuid
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Callable, Dict, List, Optional
 from urllib.request import urlopen
 from urllib.error import URLError, HTTPError
 
+from . import common
+
+
+_CONTAINER_ID_RE = re.compile(r'"container_id":"([^"]+)"')
+
+# ctr events filters (ORed together): task start/exit in nerdctl's namespace,
+# plus namespace updates used to confirm the subscription is live
+_EVENT_FILTERS = [
+    'topic=="/tasks/start",namespace=="default"',
+    'topic=="/tasks/exit",namespace=="default"',
+    'topic=="/namespaces/update",namespace=="default"',
+]
+
+# How long to wait for the events subscription before starting the container anyway
+MONITOR_READY_TIMEOUT = 5.0
+# Interval between probe labels while waiting for the subscription
+MONITOR_PROBE_INTERVAL = 0.25
+
 
 class ContainerBenchmark:
     """Track container startup and readiness metrics."""
@@ -33,55 +54,201 @@ class ContainerBenchmark:
         self.readiness_endpoint = readiness_endpoint
         self.mode = mode
         self.metrics: Dict[str, float] = {}
-        self.start_time = time.time()
-        self._event_thread: Optional[threading.Thread] = None
+        self.start_time = time.monotonic()
         self._container_started = False
+        # Elapsed time of the first /tasks/start event seen per container ID
+        self._task_starts: Dict[Optional[str], float] = {}
+        # Set by monitor_events once it has received our probe event
+        self._monitor_ready: Optional[asyncio.Event] = None
+        # Namespace label whose update event proves the subscription is live
+        self._probe_label = f"fastpull.probe.{uuid.uuid4().hex[:12]}"
+
+    def run(self, cmd: List[str], on_start: Optional[Callable[[str], None]] = None) -> bool:
+        """
+        Start the container and wait for the benchmark to finish.
 
-    def start_event_monitoring(self):
-        """Start monitoring containerd events in background thread."""
-        if self.benchmark_mode == 'none':
-            return
+        Event monitoring, container startup, and readiness/completion polling
+        all share a single asyncio event loop.
 
-        def monitor_events():
-            """Monitor ctr events for container lifecycle."""
-            try:
-                # Run sudo ctr events and parse for our container
-                proc = subprocess.Popen(
-                    ['sudo', 'ctr', 'events'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    bufsize=1
+        Args:
+            cmd: Detached container run command (prints the container ID)
+            on_start: Optional callback invoked with the container ID once started
+
+        Returns:
+            True if the benchmark finished, False if timeout
+
+        Raises:
+            subprocess.CalledProcessError: If the container fails to start
+        """
+        return asyncio.run(self._run(cmd, on_start))
+
+    async def _run(self, cmd: List[str], on_start: Optional[Callable[[str], None]]) -> bool:
+        """Run event monitoring alongside container startup and polling."""
+        print("Starting containerd events monitoring...")
+        # Created here so it binds to this run's event loop
+        self._monitor_ready = asyncio.Event()
+        monitor = asyncio.create_task(self.monitor_events())
+
+        try:
+            # Start the container only once the monitor has seen an event, so
+            # the container's /tasks/start cannot be missed
+            if self.benchmark_mode != 'none':
+                await self._wait_for_monitor()
+
+            print("Running container...")
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await proc.communicate()
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    proc.returncode, cmd,
+                    output=stdout.decode(errors='replace'),
+                    stderr=stderr.decode(errors='replace')
                 )
 
-                for line in proc.stdout:
-                    # Look for /tasks/start event (check any task since we're the only one running)
-                    if '/tasks/start' in line and self.metrics.get('container_start_time') is None:
-                        elapsed = time.time() - self.start_time
-                        self.metrics['container_start_time'] = elapsed
-                        self._container_started = True
-                        print(f"[{elapsed:.3f}s] ✓ CONTAINER START")
+            self.container_id = stdout.decode().strip()
+            if not self.container_id:
+                raise RuntimeError("Failed to get container ID")
+
+            # The start event may have arrived before the ID was known
+            self._record_container_start()
+
+            if on_start:
+                on_start(self.container_id)
+
+            if self.benchmark_mode == 'completion':
+                return await self.wait_for_completion()
+            elif self.benchmark_mode == 'readiness':
+                return await self.wait_for_readiness()
+            return True
+        finally:
+            monitor.cancel()
+            try:
+                await monitor
+            except asyncio.CancelledError:
+                pass
+
+    async def _label_namespace(self, value: str):
+        """Set (or with an empty value, remove) the probe label on the default namespace."""
+        proc = await asyncio.create_subprocess_exec(
+            'sudo', 'ctr', 'namespaces', 'label', 'default', f"{self._probe_label}={value}",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        await proc.wait()
+
+    async def _wait_for_monitor(self):
+        """
+        Wait until the ctr events subscription is delivering events.
+
+        ctr prints nothing when it subscribes, so the probe label is set on the
+        default namespace until its /namespaces/update event comes through.
+        Labels set before the subscription existed are simply not seen, hence
+        the retries. Gives up after MONITOR_READY_TIMEOUT.
+        """
+        deadline = time.monotonic() + MONITOR_READY_TIMEOUT
+        probes = 0
+        try:
+            while not self._monitor_ready.is_set() and time.monotonic() < deadline:
+                probes += 1
+                await self._label_namespace(str(probes))
+                try:
+                    await asyncio.wait_for(self._monitor_ready.wait(), timeout=MONITOR_PROBE_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Never leave the probe label on the host's namespace, even when cancelled
+            if probes:
+                await self._label_namespace('')
+
+        if not self._monitor_ready.is_set():
+            print(f"Warning: event monitoring not ready after {MONITOR_READY_TIMEOUT:.0f}s, "
+                  "starting container anyway")
+
+    async def monitor_events(self):
+        """Monitor ctr events for container lifecycle."""
+        if self.benchmark_mode == 'none':
+            self._monitor_ready.set()
+            return
 
-                    # Look for our specific container's exit event
-                    if self.container_id in line and '/tasks/exit' in line and self.benchmark_mode == 'completion':
-                        elapsed = time.time() - self.start_time
-                        self.metrics['completion_time'] = elapsed
-                        print(f"[{elapsed:.3f}s] ✓ CONTAINER EXIT")
-                        break
+        proc = None
+        try:
+            # Run sudo ctr events and parse for our container. containerd
+            # drops image, snapshot and other namespaces' events server-side;
+            # the container ID is unknown until it starts, so match on topic
+            proc = await asyncio.create_subprocess_exec(
+                'sudo', 'ctr', 'events', *_EVENT_FILTERS,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            async for raw_line in proc.stdout:
+                line = raw_line.decode(errors='replace')
+
+                # Our probe label arriving proves the subscription is live
+                if '/namespaces/update' in line:
+                    if self._probe_label in line:
+                        self._monitor_ready.set()
+                    continue
+
+                # Record /tasks/start events per container; other benchmarks may be running
+                if '/tasks/start' in line and self.metrics.get('container_start_time') is None:
+                    elapsed = time.monotonic() - self.start_time
+                    self._task_starts.setdefault(_event_container_id(line), elapsed)
+                    self._record_container_start()
+
+                # Look for our specific container's exit event
+                if self.container_id and self.container_id in line and '/tasks/exit' in line \
+                        and self.benchmark_mode == 'completion':
+                    elapsed = time.monotonic() - self.start_time
+                    self.metrics['completion_time'] = elapsed
+                    common.emit('container.exit', f"[{elapsed:.3f}s] ✓ CONTAINER EXIT", elapsed=elapsed)
+                    break
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Event monitoring error: {e}")
+        finally:
+            # Never leave the container start waiting on a failed monitor
+            self._monitor_ready.set()
+            if proc is not None and proc.returncode is None:
+                try:
+                    proc.terminate()
+                except ProcessLookupError:
+                    pass
+
+    def _record_container_start(self):
+        """Record container start time once our container's start event is seen."""
+        if 'container_start_time' in self.metrics or not self.container_id:
+            return
 
-            except Exception as e:
-                print(f"Event monitoring error: {e}")
+        elapsed = self._task_starts.get(self.container_id)
+        if elapsed is None:
+            # Fall back to events whose container ID could not be parsed
+            elapsed = self._task_starts.get(None)
+        if elapsed is None:
+            return
 
-        self._event_thread = threading.Thread(target=monitor_events, daemon=True)
-        self._event_thread.start()
+        self.metrics['container_start_time'] = elapsed
+        self._container_started = True
+        common.emit('container.start', f"[{elapsed:.3f}s] ✓ CONTAINER START",
+                    container_id=self.container_id, elapsed=elapsed)
 
-    def wait_for_readiness(self, timeout: int = 600, poll_interval: int = 2):
+    async def wait_for_readiness(self, timeout: int = 600, initial_interval: float = 0.05,
+                                 max_interval: float = 1.0):
         """
         Poll readiness endpoint until HTTP 200 response.
 
+        Polls start fast to catch quickly-ready containers and back off
+        exponentially (with jitter) so slow starters are not hammered.
+
         Args:
             timeout: Maximum time to wait in seconds
-            poll_interval: Time between polls in seconds
+            initial_interval: First delay between polls in seconds
+            max_interval: Cap on the delay between polls in seconds
 
         Returns:
             True if endpoint became ready, False if timeout
@@ -95,25 +262,27 @@ class ContainerBenchmark:
             endpoint = f'http://{endpoint}'
 
         print(f"Polling {endpoint} for readiness...")
-        end_time = time.time() + timeout
-
-        while time.time() < end_time:
-            try:
-                response = urlopen(endpoint, timeout=5)
-                if response.getcode() == 200:
-                    elapsed = time.time() - self.start_time
-                    self.metrics['readiness_time'] = elapsed
-                    print(f"Container ready (HTTP 200): {elapsed:.2f}s")
-                    return True
-            except (URLError, HTTPError):
-                pass
+        loop = asyncio.get_event_loop()
+        end_time = time.monotonic() + timeout
+        interval = initial_interval
+
+        while time.monotonic() < end_time:
+            # urllib blocks, so probe from the default executor
+            if await loop.run_in_executor(None, _probe_endpoint, endpoint):
+                elapsed = time.monotonic() - self.start_time
+                self.metrics['readiness_time'] = elapsed
+                common.emit('container.ready', f"Container ready (HTTP 200): {elapsed:.2f}s", elapsed=elapsed)
+                return True
 
-            time.sleep(poll_interval)
+            # Jitter keeps concurrent benchmarks from polling in lockstep
+            await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+            interval = min(max_interval, interval * 1.5)
 
-        print(f"Readiness check timeout after {timeout}s")
+        common.emit('benchmark.timeout', f"Readiness check timeout after {timeout}s",
+                    phase='readiness', timeout=timeout)
         return False
 
-    def wait_for_completion(self, timeout: int = 3600):
+    async def wait_for_completion(self, timeout: int = 3600):
         """
         Wait for container to exit.
 
@@ -127,27 +296,29 @@ class ContainerBenchmark:
             return True
 
         print(f"Waiting for container completion...")
-        end_time = time.time() + timeout
+        end_time = time.monotonic() + timeout
 
-        while time.time() < end_time:
+        while time.monotonic() < end_time:
             # Check if container is still running
-            result = subprocess.run(
-                ['nerdctl', 'ps', '-q', '-f', f'id={self.container_id}'],
-                capture_output=True,
-                text=True
+            proc = await asyncio.create_subprocess_exec(
+                'nerdctl', 'ps', '-q', '-f', f'id={self.container_id}',
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
             )
+            stdout, _ = await proc.communicate()
 
-            if not result.stdout.strip():
+            if not stdout.strip():
                 # Container has exited
                 if 'completion_time' not in self.metrics:
-                    elapsed = time.time() - self.start_time
+                    elapsed = time.monotonic() - self.start_time
                     self.metrics['completion_time'] = elapsed
                 print(f"Container completed")
                 return True
 
-            time.sleep(1)
+            await asyncio.sleep(1)
 
-        print(f"Completion timeout after {timeout}s")
+        common.emit('benchmark.timeout', f"Completion timeout after {timeout}s",
+                    phase='completion', timeout=timeout)
         return False
 
     def print_summary(self):
@@ -169,9 +340,10 @@ class ContainerBenchmark:
         if 'completion_time' in self.metrics:
             print(f"Time to Completion:      {self.metrics['completion_time']:.3f}s")
 
-        total_time = time.time() - self.start_time
+        total_time = time.monotonic() - self.start_time
         print(f"Total Elapsed Time:      {total_time:.3f}s")
         print("="*50 + "\n")
+        common.emit('benchmark.summary', mode=self.mode, metrics=self.metrics, total_time=total_time)
 
     def export_json(self, filepath: str):
         """
@@ -191,3 +363,34 @@ class ContainerBenchmark:
             json.dump(output, f, indent=2)
 
         print(f"Metrics exported to {filepath}")
+
+
+def _event_container_id(line: str) -> Optional[str]:
+    """
+    Extract the container ID from a `ctr events` task event line.
+
+    Args:
+        line: Event line (e.g., '... /tasks/start {"container_id":"abc...","pid":42}')
+
+    Returns:
+        Container ID, or None if the line has none
+    """
+    match = _CONTAINER_ID_RE.search(line)
+    return match.group(1) if match else None
+
+
+def _probe_endpoint(endpoint: str) -> bool:
+    """
+    Check whether an HTTP endpoint responds with status 200.
+
+    Args:
+        endpoint: URL to probe
+
+    Returns:
+        True on HTTP 200, False otherwise
+    """
+    try:
+        response = urlopen(endpoint, timeout=5)
+        return response.getcode() == 200
+    except (URLError, HTTPError, OSError):
+        return False
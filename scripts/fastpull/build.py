@@ -8,13 +8,34 @@ Supports two modes:
 
 import argparse
 import os
+import stat
 import subprocess
 import sys
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import lru_cache, partial
+from typing import List, Optional
 
 from . import common
 
 
+# Serializes `nerdctl pull` so parallel conversions don't race the local content store
+_pull_lock = threading.Lock()
+
+# Shared by the SOCI and eStarGZ conversions; entered once per run_conversions call
+_nerdctl = common.NerdctlSession()
+
+# Formats converted through sudo nerdctl (nydusify needs no sudo)
+_SUDO_FORMATS = {'soci', 'estargz'}
+
+# Images pulled into containerd by this run, shared by the SOCI and eStarGZ conversions
+_pulled_images = set()
+
+# Oldest nerdctl release relied on for `nerdctl image convert --estargz --oci`
+_ESTARGZ_CONVERT_MIN_VERSION = (1, 0, 0)
+
+
 def add_parser(subparsers):
     """Add build subcommand parser."""
     parser = subparsers.add_parser(
@@ -68,6 +89,19 @@ def add_parser(subparsers):
         action='store_true',
         help='Build without cache'
     )
+    parser.add_argument(
+        '--no-remote-cache',
+        action='store_true',
+        help='Do not reuse layers from the registry (--cache-from)'
+    )
+    parser.add_argument(
+        '--cache-ref',
+        help='Image to pull inline layer cache from (default: --repository-url)'
+    )
+    parser.add_argument(
+        '--nydus-cache-ref',
+        help='Registry image caching Nydus conversions across runs (default: <repository>:nydus-cache)'
+    )
     parser.add_argument(
         '--build-arg',
         action='append',
@@ -78,6 +112,12 @@ def add_parser(subparsers):
         default='Dockerfile',
         help='Dockerfile name (default: Dockerfile)'
     )
+    parser.add_argument(
+        '--parallel',
+        type=int,
+        metavar='N',
+        help='Maximum concurrent format conversions (default: number of formats, capped at CPU count)'
+    )
 
     parser.set_defaults(func=build_command)
     return parser
@@ -125,6 +165,19 @@ def build_command(args):
             print(f"Error: Invalid format '{fmt}'. Valid: {', '.join(valid_formats)}")
             sys.exit(1)
 
+    # Nydus build cache shares the remote-cache switch with the docker build
+    if args.no_remote_cache:
+        args.nydus_cache_ref = None
+    elif not args.nydus_cache_ref:
+        repo, _, _ = common.split_image_ref(args.repository_url)
+        args.nydus_cache_ref = f"{repo}:nydus-cache"
+
+    if args.parallel is None:
+        args.parallel = min(len(formats), os.cpu_count() or 1)
+    elif args.parallel < 1:
+        print("Error: --parallel must be at least 1")
+        sys.exit(1)
+
     # Determine build mode
     if args.dockerfile_path:
         # Mode 1: Build from Dockerfile
@@ -161,33 +214,44 @@ def authenticate_registry(args) -> bool:
 def authenticate_ecr(args) -> bool:
     """Authenticate with AWS ECR."""
     try:
-        # Get login password
-        result = subprocess.run(
-            ['aws', 'ecr', 'get-login-password', '--region', args.region],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        password = result.stdout.strip()
-
-        # Login with docker
+        # Get login password, in-process when boto3 is available
+        credentials = common.get_ecr_credentials(args.region)
+        if credentials:
+            username, password = credentials
+        else:
+            result = subprocess.run(
+                ['aws', 'ecr', 'get-login-password', '--region', args.region],
+                check=True,
+                capture_output=True,
+                text=True
+            )
+            username, password = 'AWS', result.stdout.strip()
+
+        # docker and nerdctl keep separate credential stores; log in to both concurrently
         registry_url = f"{args.account}.dkr.ecr.{args.region}.amazonaws.com"
-        subprocess.run(
-            ['docker', 'login', '--username', 'AWS', '--password-stdin', registry_url],
-            input=password,
-            check=True,
-            capture_output=True,
-            text=True
-        )
-
-        # Login with nerdctl
-        subprocess.run(
-            ['sudo', 'nerdctl', 'login', '--username', 'AWS', '--password-stdin', registry_url],
-            input=password,
-            check=True,
-            capture_output=True,
-            text=True
-        )
+        logins = {
+            'docker': ['docker', 'login', '--username', username, '--password-stdin', registry_url],
+            'nerdctl': ['sudo', 'nerdctl', 'login', '--username', username, '--password-stdin', registry_url],
+        }
+
+        def login(cmd: List[str]):
+            common.run_quiet(cmd, input=password)
+
+        # Validate sudo up front so the nerdctl login never prompts mid-flight
+        common.refresh_sudo()
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=len(logins)) as executor:
+            futures = {executor.submit(login, cmd): name for name, cmd in logins.items()}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except subprocess.CalledProcessError as e:
+                    errors.append(f"{futures[future]}: {(e.stderr or str(e)).strip()}")
+
+        if errors:
+            print(f"✗ ECR authentication failed: {'; '.join(errors)}")
+            return False
 
         print(f"✓ Authenticated with ECR")
         return True
@@ -200,20 +264,10 @@ def authenticate_gar(args) -> bool:
     """Authenticate with Google Artifact Registry."""
     try:
         if not args.project_id:
-            result = subprocess.run(
-                ['gcloud', 'config', 'get', 'project'],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            args.project_id = result.stdout.strip()
+            args.project_id = common.get_gcloud_project()
 
         registry_url = f"{args.location}-docker.pkg.dev"
-        subprocess.run(
-            ['gcloud', 'auth', 'configure-docker', registry_url, '--quiet'],
-            check=True,
-            capture_output=True
-        )
+        common.run_quiet(['gcloud', 'auth', 'configure-docker', registry_url, '--quiet'])
 
         print(f"✓ Authenticated with GAR")
         return True
@@ -229,7 +283,12 @@ def build_from_dockerfile(args, formats: List[str]):
     print("="*60)
 
     # Auto-detect if dockerfile_path is a file or directory
-    if os.path.isfile(args.dockerfile_path):
+    try:
+        path_is_file = stat.S_ISREG(os.stat(args.dockerfile_path).st_mode)
+    except OSError:
+        path_is_file = False
+
+    if path_is_file:
         # User provided a file path, extract directory and filename
         dockerfile_dir = os.path.dirname(args.dockerfile_path)
         dockerfile_name = os.path.basename(args.dockerfile_path)
@@ -243,17 +302,18 @@ def build_from_dockerfile(args, formats: List[str]):
         args.dockerfile_path = dockerfile_dir
 
         print(f"Detected Dockerfile: {dockerfile_name} in {dockerfile_dir}")
-
-    # Validate directory exists
-    if not os.path.isdir(args.dockerfile_path):
-        print(f"Error: Directory not found: {args.dockerfile_path}")
-        sys.exit(1)
-
-    # Construct full Dockerfile path
-    dockerfile_path = os.path.join(args.dockerfile_path, args.dockerfile)
-    if not os.path.isfile(dockerfile_path):
-        print(f"Error: Dockerfile not found: {dockerfile_path}")
-        sys.exit(1)
+    else:
+        # A single stat of the joined path covers both a missing directory
+        # and a missing Dockerfile
+        dockerfile_path = os.path.join(args.dockerfile_path, args.dockerfile)
+        try:
+            path_is_file = stat.S_ISREG(os.stat(dockerfile_path).st_mode)
+        except OSError:
+            path_is_file = False
+
+        if not path_is_file:
+            print(f"Error: Dockerfile not found: {dockerfile_path}")
+            sys.exit(1)
 
     built_images = []
 
@@ -263,20 +323,7 @@ def build_from_dockerfile(args, formats: List[str]):
             built_images.append(args.repository_url)
 
     # Convert to other formats
-    if 'nydus' in formats:
-        nydus_image = f"{args.repository_url.rsplit(':', 1)[0]}:{args.repository_url.rsplit(':', 1)[1]}-fastpull"
-        if convert_to_nydus(args.repository_url, nydus_image):
-            built_images.append(nydus_image)
-
-    if 'soci' in formats:
-        soci_image = f"{args.repository_url.rsplit(':', 1)[0]}:{args.repository_url.rsplit(':', 1)[1]}-soci"
-        if convert_to_soci(args.repository_url, soci_image):
-            built_images.append(soci_image)
-
-    if 'estargz' in formats:
-        estargz_image = f"{args.repository_url.rsplit(':', 1)[0]}:{args.repository_url.rsplit(':', 1)[1]}-estargz"
-        if convert_to_estargz(args.repository_url, estargz_image):
-            built_images.append(estargz_image)
+    built_images.extend(run_conversions(args, formats))
 
     # Summary
     print_summary(built_images)
@@ -291,38 +338,71 @@ def convert_existing_image(args, formats: List[str]):
     built_images = []
 
     # Convert to requested formats
-    if 'nydus' in formats:
-        nydus_image = f"{args.repository_url.rsplit(':', 1)[0]}:{args.repository_url.rsplit(':', 1)[1]}-fastpull"
-        if convert_to_nydus(args.repository_url, nydus_image):
-            built_images.append(nydus_image)
-
-    if 'soci' in formats:
-        soci_image = f"{args.repository_url.rsplit(':', 1)[0]}:{args.repository_url.rsplit(':', 1)[1]}-soci"
-        if convert_to_soci(args.repository_url, soci_image):
-            built_images.append(soci_image)
-
-    if 'estargz' in formats:
-        estargz_image = f"{args.repository_url.rsplit(':', 1)[0]}:{args.repository_url.rsplit(':', 1)[1]}-estargz"
-        if convert_to_estargz(args.repository_url, estargz_image):
-            built_images.append(estargz_image)
+    built_images.extend(run_conversions(args, formats))
 
     # Summary
     print_summary(built_images)
 
 
+def run_conversions(args, formats: List[str]) -> List[str]:
+    """
+    Convert the image at args.repository_url to several formats concurrently.
+
+    Each conversion is an independent external pipeline writing its own target
+    tag, so they run side by side in a thread pool of args.parallel workers.
+
+    Args:
+        args: Parsed build arguments
+        formats: Requested formats; those without a converter are ignored
+
+    Returns:
+        Successfully converted target images, in the order requested
+    """
+    repo, tag, _ = common.split_image_ref(args.repository_url)
+    converters = {fmt: converter for fmt, converter, _ in FORMAT_CONVERTERS}
+    converters['nydus'] = partial(convert_to_nydus, build_cache=args.nydus_cache_ref)
+
+    targets = [
+        (fmt, f"{repo}:{tag}{suffix}")
+        for fmt, _, suffix in FORMAT_CONVERTERS
+        if fmt in formats
+    ]
+    if not targets:
+        return []
+
+    results = {}
+    # Validate sudo before fanning out, so parallel workers never prompt at once;
+    # Nydus-only runs never touch sudo, so they skip the prompt entirely
+    session = _nerdctl if any(fmt in _SUDO_FORMATS for fmt, _ in targets) else nullcontext()
+    with session, ThreadPoolExecutor(max_workers=min(args.parallel, len(targets))) as executor:
+        futures = {
+            executor.submit(converters[fmt], args.repository_url, target): target
+            for fmt, target in targets
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    return [target for _, target in targets if results[target]]
+
+
 def build_and_push_docker(args) -> bool:
     """Build and push Docker image."""
     print(f"\n[Docker] Building {args.repository_url}...")
 
-    # Build
+    # Build with BuildKit, embedding inline cache metadata in the pushed image
+    # so later builds can reuse its layers via --cache-from
     cmd = [
-        'sudo', 'docker', 'build',
+        'sudo', 'env', 'DOCKER_BUILDKIT=1', 'docker', 'build',
         '-t', args.repository_url,
-        '-f', os.path.join(args.dockerfile_path, args.dockerfile)
+        '-f', os.path.join(args.dockerfile_path, args.dockerfile),
+        '--build-arg', 'BUILDKIT_INLINE_CACHE=1'
     ]
 
     if args.no_cache:
         cmd.append('--no-cache')
+    elif not args.no_remote_cache:
+        # A missing tag (first build) is ignored by BuildKit
+        cmd.extend(['--cache-from', args.cache_ref or args.repository_url])
 
     if args.build_arg:
         for build_arg in args.build_arg:
@@ -330,26 +410,66 @@ def build_and_push_docker(args) -> bool:
 
     cmd.append(args.dockerfile_path)
 
-    try:
-        subprocess.run(cmd, check=True)
-        print(f"[Docker] ✓ Built {args.repository_url}")
-    except subprocess.CalledProcessError:
-        print(f"[Docker] ✗ Build failed")
+    returncode, elapsed = common.stream_command(cmd, '[Docker]')
+    if returncode != 0:
+        common.emit('docker.build.failed', "[Docker] ✗ Build failed", image=args.repository_url)
         return False
+    common.emit('docker.build.done', f"[Docker] ✓ Built {args.repository_url} ({elapsed:.1f}s)",
+                image=args.repository_url, elapsed=elapsed)
 
     # Push
     print(f"[Docker] Pushing {args.repository_url}...")
-    try:
-        subprocess.run(['sudo', 'docker', 'push', args.repository_url], check=True)
-        print(f"[Docker] ✓ Pushed {args.repository_url}")
-        return True
-    except subprocess.CalledProcessError:
-        print(f"[Docker] ✗ Push failed")
+    returncode, elapsed = common.stream_command(['sudo', 'docker', 'push', args.repository_url], '[Docker]')
+    if returncode != 0:
+        common.emit('docker.push.failed', "[Docker] ✗ Push failed", image=args.repository_url)
         return False
+    common.emit('docker.push.done', f"[Docker] ✓ Pushed {args.repository_url} ({elapsed:.1f}s)",
+                image=args.repository_url, elapsed=elapsed)
+    return True
+
+
+def ensure_pulled(image: str, prefix: str):
+    """
+    Pull an image into containerd once per run.
+
+    A copy left by an earlier run is not trusted, since the tag may have moved
+    in the registry; containerd skips blobs it already has, so re-pulling an
+    up-to-date image costs only a manifest round trip.
+
+    Args:
+        image: Image reference
+        prefix: Log prefix (e.g., '[SOCI]')
 
+    Raises:
+        subprocess.CalledProcessError: If the pull fails
+    """
+    with _pull_lock:
+        if image in _pulled_images:
+            print(f"{prefix} Using {image} pulled earlier in this run")
+            return
+        _nerdctl.pull(image)
+        _pulled_images.add(image)
 
-def convert_to_nydus(source_image: str, target_image: str) -> bool:
-    """Convert to Nydus format."""
+
+@lru_cache(maxsize=None)
+def _nydusify_convert_help() -> str:
+    """Return `nydusify convert --help` output, probed once per process."""
+    try:
+        result = subprocess.run(['nydusify', 'convert', '--help'], capture_output=True, text=True)
+    except FileNotFoundError:
+        return ''
+    return result.stdout + result.stderr
+
+
+def convert_to_nydus(source_image: str, target_image: str, build_cache: Optional[str] = None) -> bool:
+    """
+    Convert to Nydus format.
+
+    Args:
+        source_image: Image to convert
+        target_image: Nydus image to push
+        build_cache: Registry image caching converted blobs across runs (None to disable)
+    """
     print(f"\n[Nydus] Converting {source_image} → {target_image}...")
 
     cmd = [
@@ -358,41 +478,49 @@ def convert_to_nydus(source_image: str, target_image: str) -> bool:
         '--target', target_image
     ]
 
-    try:
-        subprocess.run(cmd, check=True)
-        print(f"[Nydus] ✓ Converted and pushed {target_image}")
-        return True
-    except subprocess.CalledProcessError:
-        print(f"[Nydus] ✗ Conversion failed")
+    # Only pass flags the installed nydusify understands
+    supported = _nydusify_convert_help()
+    if '--fs-version' in supported:
+        cmd.extend(['--fs-version', '6'])
+    if build_cache and '--build-cache' in supported:
+        # Reuse layers converted by previous runs instead of re-chunking them
+        cmd.extend(['--build-cache', build_cache, '--build-cache-max-records', '200'])
+
+    returncode, elapsed = common.stream_command(cmd, '[Nydus]')
+    if returncode != 0:
+        common.emit('convert.failed', "[Nydus] ✗ Conversion failed", format='nydus', image=target_image)
         return False
+    common.emit('convert.done', f"[Nydus] ✓ Converted and pushed {target_image} ({elapsed:.1f}s)",
+                format='nydus', image=target_image, elapsed=elapsed)
+    return True
 
 
 def convert_to_soci(source_image: str, target_image: str) -> bool:
     """Convert to SOCI format."""
     print(f"\n[SOCI] Converting {source_image} → {target_image}...")
 
-    # Pull with nerdctl
+    # Pull with nerdctl, unless an up-to-date copy is already local
     try:
-        subprocess.run(['sudo', 'nerdctl', 'pull', source_image], check=True, capture_output=True)
+        ensure_pulled(source_image, '[SOCI]')
     except subprocess.CalledProcessError:
-        print(f"[SOCI] ✗ Pull failed")
+        common.emit('convert.failed', "[SOCI] ✗ Pull failed", format='soci', image=target_image)
         return False
 
     # Convert
-    try:
-        subprocess.run(['sudo', 'soci', 'create', source_image], check=True)
-    except subprocess.CalledProcessError:
-        print(f"[SOCI] ✗ Conversion failed")
+    returncode, _ = common.stream_command(['sudo', 'soci', 'create', source_image], '[SOCI]')
+    if returncode != 0:
+        common.emit('convert.failed', "[SOCI] ✗ Conversion failed", format='soci', image=target_image)
         return False
 
     # Tag and push
     try:
-        subprocess.run(['sudo', 'nerdctl', 'tag', source_image, target_image], check=True)
-        subprocess.run(['sudo', 'nerdctl', 'push', target_image], check=True)
-        print(f"[SOCI] ✓ Converted and pushed {target_image}")
+        _nerdctl.tag(source_image, target_image)
+        _nerdctl.push(target_image, prefix='[SOCI]')
+        common.emit('convert.done', f"[SOCI] ✓ Converted and pushed {target_image}",
+                    format='soci', image=target_image)
         return True
     except subprocess.CalledProcessError:
-        print(f"[SOCI] ✗ Push failed")
+        common.emit('convert.failed', "[SOCI] ✗ Push failed", format='soci', image=target_image)
         return False
 
 
@@ -400,20 +528,45 @@ def convert_to_estargz(source_image: str, target_image: str) -> bool:
     """Convert to eStarGZ format."""
     print(f"\n[eStarGZ] Converting {source_image} → {target_image}...")
 
+    version = common.get_nerdctl_version()
+    if version is None or version < _ESTARGZ_CONVERT_MIN_VERSION:
+        return _convert_to_estargz_legacy(source_image, target_image)
+
     try:
-        subprocess.run(['sudo', 'nerdctl', '--snapshotter', 'stargz', 'pull', source_image],
-                      check=True, capture_output=True)
-        subprocess.run(['sudo', 'nerdctl', '--snapshotter', 'stargz', 'tag', source_image, target_image],
-                      check=True)
-        subprocess.run(['sudo', 'nerdctl', '--snapshotter', 'stargz', 'push', target_image],
-                      check=True)
-        print(f"[eStarGZ] ✓ Converted and pushed {target_image}")
+        ensure_pulled(source_image, '[eStarGZ]')
+        _nerdctl.convert(source_image, target_image, ['--estargz', '--oci'], prefix='[eStarGZ]')
+        _nerdctl.push(target_image, prefix='[eStarGZ]')
+        common.emit('convert.done', f"[eStarGZ] ✓ Converted and pushed {target_image}",
+                    format='estargz', image=target_image)
         return True
     except subprocess.CalledProcessError:
-        print(f"[eStarGZ] ✗ Conversion failed")
+        common.emit('convert.failed', "[eStarGZ] ✗ Conversion failed", format='estargz', image=target_image)
         return False
 
 
+def _convert_to_estargz_legacy(source_image: str, target_image: str) -> bool:
+    """Pull, tag, and push through the stargz snapshotter (nerdctl without image convert)."""
+    try:
+        with _pull_lock:
+            _nerdctl.pull(source_image, snapshotter='stargz')
+        _nerdctl.tag(source_image, target_image, snapshotter='stargz')
+        _nerdctl.push(target_image, snapshotter='stargz', prefix='[eStarGZ]')
+        common.emit('convert.done', f"[eStarGZ] ✓ Converted and pushed {target_image}",
+                    format='estargz', image=target_image)
+        return True
+    except subprocess.CalledProcessError:
+        common.emit('convert.failed', "[eStarGZ] ✗ Conversion failed", format='estargz', image=target_image)
+        return False
+
+
+# (format, converter, target tag suffix), in the order conversions are reported
+FORMAT_CONVERTERS = [
+    ('nydus', convert_to_nydus, '-fastpull'),
+    ('soci', convert_to_soci, '-soci'),
+    ('estargz', convert_to_estargz, '-estargz'),
+]
+
+
 def print_summary(images: List[str]):
     """Print build summary."""
     print("\n" + "="*60)
@@ -426,3 +579,4 @@ def print_summary(images: List[str]):
     else:
         print("No images were built successfully")
     print("="*60)
+    common.emit('build.summary', images=images)
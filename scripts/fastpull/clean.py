@@ -3,9 +3,11 @@ FastPull clean command - Remove local images and artifacts.
 """
 
 import argparse
-import subprocess
 import sys
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from . import common
 
 
 def add_parser(subparsers):
@@ -35,7 +37,7 @@ def add_parser(subparsers):
         '--snapshotter',
         choices=['nydus', 'overlayfs', 'all'],
         default='all',
-        help='Target specific snapshotter (default: all)'
+        help='Accepted for compatibility; containers and images are shared by all snapshotters'
     )
     parser.add_argument(
         '--dry-run',
@@ -63,119 +65,88 @@ def clean_command(args):
         args.images = True
         args.containers = True
 
-    # Determine which snapshotters to clean
-    snapshotters = ['nydus', 'overlayfs'] if args.snapshotter == 'all' else [args.snapshotter]
-
-    # Clean containers first
-    if args.containers:
-        clean_containers(snapshotters, args.dry_run, args.force)
+    # One session validates sudo once and batches every removal
+    with common.NerdctlSession() as session:
+        plan = plan_cleanup(session, args.containers, args.images)
+        print_plan(plan, args.dry_run)
 
-    # Clean images
-    if args.images:
-        clean_images(snapshotters, args.dry_run, args.force)
+        if args.dry_run or not any(plan.values()):
+            return
 
+        # Single confirmation for everything in the plan
+        if not args.force:
+            response = input("Proceed with removal? [y/N]: ")
+            if response.lower() != 'y':
+                print("Skipped")
+                return
 
-def clean_containers(snapshotters: List[str], dry_run: bool = False, force: bool = False):
-    """
-    Remove stopped containers.
-
-    Args:
-        snapshotters: List of snapshotters to target
-        dry_run: If True, only show what would be removed
-        force: If True, skip confirmation
-    """
-    print("\n=== Cleaning Containers ===")
-
-    for snapshotter in snapshotters:
-        # Get all containers (including stopped ones)
-        result = subprocess.run(
-            ['sudo', 'nerdctl', '--snapshotter', snapshotter, 'ps', '-a', '-q'],
-            capture_output=True,
-            text=True
-        )
+        apply_cleanup(session, plan)
 
-        container_ids = result.stdout.strip().split('\n') if result.stdout.strip() else []
+    print("\n=== Cleanup Complete ===\n")
 
-        if not container_ids:
-            print(f"[{snapshotter}] No containers to clean")
-            continue
 
-        print(f"[{snapshotter}] Found {len(container_ids)} container(s)")
+def plan_cleanup(session: common.NerdctlSession, containers: bool, images: bool) -> Dict[str, List[str]]:
+    """
+    Enumerate everything to remove, querying containerd concurrently.
 
-        if dry_run:
-            print(f"[{snapshotter}] Would remove {len(container_ids)} container(s)")
-            for cid in container_ids:
-                print(f"  - {cid}")
-            continue
+    Containers and images are stored in the containerd namespace rather than
+    per snapshotter, so a single listing of each covers every snapshotter.
 
-        # Confirm removal
-        if not force:
-            response = input(f"Remove {len(container_ids)} container(s) for {snapshotter}? [y/N]: ")
-            if response.lower() != 'y':
-                print(f"[{snapshotter}] Skipped")
-                continue
+    Args:
+        session: Active nerdctl session
+        containers: Include all containers (including stopped ones)
+        images: Include all images
 
-        # Remove containers
-        for cid in container_ids:
-            subprocess.run(
-                ['sudo', 'nerdctl', '--snapshotter', snapshotter, 'rm', '-f', cid],
-                capture_output=True
-            )
+    Returns:
+        Dict mapping each requested kind ('containers', 'images') to IDs/references
+    """
+    listings = {}
+    if containers:
+        listings['containers'] = session.ps
+    if images:
+        listings['images'] = session.images
 
-        print(f"[{snapshotter}] Removed {len(container_ids)} container(s)")
+    with ThreadPoolExecutor(max_workers=len(listings)) as executor:
+        futures = {kind: executor.submit(listing) for kind, listing in listings.items()}
+        return {kind: future.result() for kind, future in futures.items()}
 
 
-def clean_images(snapshotters: List[str], dry_run: bool = False, force: bool = False):
+def print_plan(plan: Dict[str, List[str]], dry_run: bool = False):
     """
-    Remove all images.
+    Print a consolidated summary of the cleanup plan.
 
     Args:
-        snapshotters: List of snapshotters to target
-        dry_run: If True, only show what would be removed
-        force: If True, skip confirmation
+        plan: Cleanup plan from plan_cleanup
+        dry_run: If True, phrase the summary as what would be removed
     """
-    print("\n=== Cleaning Images ===")
-
-    for snapshotter in snapshotters:
-        # Get all images
-        result = subprocess.run(
-            ['sudo', 'nerdctl', '--snapshotter', snapshotter, 'images', '-q'],
-            capture_output=True,
-            text=True
-        )
-
-        image_ids = result.stdout.strip().split('\n') if result.stdout.strip() else []
-
-        if not image_ids:
-            print(f"[{snapshotter}] No images to clean")
-            continue
-
-        print(f"[{snapshotter}] Found {len(image_ids)} image(s)")
-
-        if dry_run:
-            print(f"[{snapshotter}] Would remove {len(image_ids)} image(s)")
-            # Show image details
-            result = subprocess.run(
-                ['sudo', 'nerdctl', '--snapshotter', snapshotter, 'images'],
-                capture_output=True,
-                text=True
-            )
-            print(result.stdout)
+    verb = "Would remove" if dry_run else "Found"
+    for kind, items in plan.items():
+        print(f"\n=== Cleaning {kind.capitalize()} ===")
+        if not items:
+            print(f"No {kind} to clean")
             continue
+        print(f"{verb} {len(items)} {kind[:-1]}(s)")
+        for item in items:
+            print(f"  - {item}")
 
-        # Confirm removal
-        if not force:
-            response = input(f"Remove {len(image_ids)} image(s) for {snapshotter}? [y/N]: ")
-            if response.lower() != 'y':
-                print(f"[{snapshotter}] Skipped")
-                continue
 
-        # Remove images
-        subprocess.run(
-            ['sudo', 'nerdctl', '--snapshotter', snapshotter, 'rmi', '-f'] + image_ids,
-            capture_output=True
-        )
+def apply_cleanup(session: common.NerdctlSession, plan: Dict[str, List[str]]):
+    """
+    Remove everything in the cleanup plan.
 
-        print(f"[{snapshotter}] Removed {len(image_ids)} image(s)")
+    Containers are removed before images so their snapshots no longer hold
+    references when the images are garbage collected.
 
-    print("\n=== Cleanup Complete ===\n")
+    Args:
+        session: Active nerdctl session
+        plan: Cleanup plan from plan_cleanup
+    """
+    container_ids = plan.get('containers')
+    if container_ids:
+        session.rm(container_ids)
+        print(f"Removed {len(container_ids)} container(s)")
+
+    image_refs = plan.get('images')
+    if image_refs:
+        session.rmi(image_refs)
+        print(f"Removed {len(image_refs)} image(s)")
@@ -8,11 +8,53 @@ Main CLI entry point for the unified fastpull command.
 import argparse
 import sys
 
-from . import __version__, run, build, quickstart, clean
+from . import __version__, common, run, build, quickstart, clean
+
+# Flags the clean fast path understands; anything else goes through argparse
+_CLEAN_FAST_FLAGS = {'--images', '--containers', '--all', '--dry-run', '--force'}
+
+
+def _parse_clean_fast(argv):
+    """
+    Parse simple 'fastpull clean' invocations without building the argparse tree.
+
+    Args:
+        argv: Arguments following the 'clean' command
+
+    Returns:
+        Namespace equivalent to the argparse result, or None to fall back
+    """
+    flags = set(argv)
+    if not flags or not flags <= _CLEAN_FAST_FLAGS:
+        return None
+
+    return argparse.Namespace(
+        command='clean',
+        images='--images' in flags,
+        containers='--containers' in flags,
+        all='--all' in flags,
+        snapshotter='all',
+        dry_run='--dry-run' in flags,
+        force='--force' in flags,
+        func=clean.clean_command
+    )
+
+
+# Commands with a hand-rolled parser for their common argument shapes
+_FAST_PATHS = {
+    'clean': _parse_clean_fast,
+}
 
 
 def main():
     """Main CLI entry point."""
+    # Skip argparse setup for hot, simple invocations (e.g. clean loops in CI)
+    if len(sys.argv) >= 2 and sys.argv[1] in _FAST_PATHS:
+        args = _FAST_PATHS[sys.argv[1]](sys.argv[2:])
+        if args is not None:
+            _execute(args)
+            return
+
     parser = argparse.ArgumentParser(
         prog='fastpull',
         description='FastPull - Accelerate AI/ML container startup with lazy-loading snapshotters',
@@ -35,6 +77,16 @@ For more information, visit: https://github.com/tensorfuse/fastpull
         action='version',
         version=f'%(prog)s {__version__}'
     )
+    parser.add_argument(
+        '--refresh-credentials',
+        action='store_true',
+        help='Discard cached cloud account, region, and project lookups'
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Write progress as JSON lines on stdout (human output goes to stderr)'
+    )
 
     # Create subparsers for commands
     subparsers = parser.add_subparsers(
@@ -58,14 +110,23 @@ For more information, visit: https://github.com/tensorfuse/fastpull
         parser.print_help()
         sys.exit(1)
 
-    # Execute the command
+    if args.json:
+        common.enable_json_mode()
+    if args.refresh_credentials:
+        common.clear_probe_cache()
+
+    _execute(args)
+
+
+def _execute(args):
+    """Run the selected command with common interrupt and error handling."""
     try:
         args.func(args)
     except KeyboardInterrupt:
-        print("\n\nInterrupted by user")
+        common.emit('interrupted', "\n\nInterrupted by user")
         sys.exit(130)
     except Exception as e:
-        print(f"Error: {e}")
+        common.emit('error', f"Error: {e}", detail=str(e))
         sys.exit(1)
 
 
@@ -4,9 +4,98 @@ Common utilities for fastpull commands.
 Includes registry detection, authentication helpers, and shared functions.
 """
 
+import base64
+import fcntl
+import hashlib
+import json
+import os
 import re
 import subprocess
-from typing import Optional, Tuple
+import sys
+import time
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# Maximum IDs passed to a single removal invocation, keeping argv well under ARG_MAX
+REMOVE_BATCH_SIZE = 500
+
+# Shared boto3 session, created on first use
+_boto_session = None
+
+# Stream receiving JSON events when --json is enabled, None in human mode
+_json_stream = None
+
+# Persistent cache for slow environment probes (account, region, project)
+PROBE_CACHE_PATH = os.path.expanduser('~/.cache/fastpull/env.json')
+PROBE_CACHE_TTL = 3600
+
+# Environment variables that select AWS credentials or region; part of AWS probe cache keys
+_AWS_CONTEXT_VARS = (
+    'AWS_PROFILE', 'AWS_ACCESS_KEY_ID', 'AWS_SESSION_TOKEN', 'AWS_REGION', 'AWS_DEFAULT_REGION',
+    'AWS_CONFIG_FILE', 'AWS_SHARED_CREDENTIALS_FILE',
+)
+
+# Registry URL patterns, compiled once at import
+_ECR_RE = re.compile(r'(\d+)\.dkr\.ecr\.([^.]+)\.amazonaws\.com/(.+)')
+# Pattern: location-docker.pkg.dev/project/repository/image:tag
+# Use .+? for location to handle hyphens (e.g., us-central1)
+_GAR_RE = re.compile(r'(.+?)-docker\.pkg\.dev/([^/]+)/([^/]+)')
+
+
+def enable_json_mode():
+    """
+    Switch output to machine-readable events.
+
+    Events are written as JSON lines to the original stdout. Everything else,
+    including output of child processes, is redirected to stderr so stdout
+    carries nothing but events.
+    """
+    global _json_stream
+    if _json_stream is not None:
+        return
+
+    sys.stdout.flush()
+    _json_stream = os.fdopen(os.dup(1), 'w', buffering=1)
+    os.dup2(2, 1)
+
+    # sys.stdout was block-buffered for the original pipe; flush log lines as they come
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=True)
+
+
+def emit(event: str, message: Optional[str] = None, **fields):
+    """
+    Report a progress event.
+
+    Args:
+        event: Dotted event name, e.g. 'docker.build.done'
+        message: Human-readable text, printed in both modes (to stderr with --json)
+        **fields: Structured event data (must be JSON serializable)
+    """
+    if message is not None:
+        print(message, flush=_json_stream is not None)
+    if _json_stream is not None:
+        _json_stream.write(json.dumps({'event': event, 'ts': time.time(), **fields}) + '\n')
+
+
+def parse_event(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a line written by emit() in JSON mode.
+
+    Args:
+        line: Output line of a fastpull --json process
+
+    Returns:
+        Event dict, or None if the line is not an event
+    """
+    if not line.startswith('{"event"'):
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
 
 
 def detect_registry_type(image: str) -> str:
@@ -28,6 +117,7 @@ def detect_registry_type(image: str) -> str:
     return 'unknown'
 
 
+@lru_cache(maxsize=128)
 def parse_ecr_url(image: str) -> Optional[Tuple[str, str, str]]:
     """
     Parse ECR image URL to extract account, region, and repository.
@@ -38,13 +128,16 @@ def parse_ecr_url(image: str) -> Optional[Tuple[str, str, str]]:
     Returns:
         Tuple of (account_id, region, repository) or None if invalid
     """
-    pattern = r'(\d+)\.dkr\.ecr\.([^.]+)\.amazonaws\.com/(.+)'
-    match = re.match(pattern, image)
+    # Cheap substring check before running the regex
+    if '.dkr.ecr.' not in image:
+        return None
+    match = _ECR_RE.match(image)
     if match:
         return match.group(1), match.group(2), match.group(3)
     return None
 
 
+@lru_cache(maxsize=128)
 def parse_gar_url(image: str) -> Optional[Tuple[str, str, str]]:
     """
     Parse GAR image URL to extract location, project, and repository.
@@ -55,15 +148,38 @@ def parse_gar_url(image: str) -> Optional[Tuple[str, str, str]]:
     Returns:
         Tuple of (location, project_id, repository) or None if invalid
     """
-    # Pattern: location-docker.pkg.dev/project/repository/image:tag
-    # Use .+? for location to handle hyphens (e.g., us-central1)
-    pattern = r'(.+?)-docker\.pkg\.dev/([^/]+)/([^/]+)'
-    match = re.match(pattern, image)
+    # Cheap substring check before running the regex
+    if '-docker.pkg.dev/' not in image:
+        return None
+    match = _GAR_RE.match(image)
     if match:
         return match.group(1), match.group(2), match.group(3)
     return None
 
 
+def split_image_ref(image: str) -> Tuple[str, str, Optional[str]]:
+    """
+    Split an image reference into repository, tag, and digest.
+
+    A registry port (e.g., host:5000/app) is not mistaken for a tag, and a
+    reference without a tag defaults to 'latest'.
+
+    Args:
+        image: Image reference (e.g., registry/app:v1 or registry/app@sha256:...)
+
+    Returns:
+        Tuple of (repository, tag, digest); digest is None unless pinned
+    """
+    digest = None
+    if '@' in image:
+        image, digest = image.split('@', 1)
+
+    if ':' in image.rsplit('/', 1)[-1]:
+        repository, tag = image.rsplit(':', 1)
+        return repository, tag, digest
+    return image, 'latest', digest
+
+
 def run_command(cmd: list, check: bool = True, capture_output: bool = True) -> subprocess.CompletedProcess:
     """
     Run a shell command with consistent error handling.
@@ -84,6 +200,247 @@ def run_command(cmd: list, check: bool = True, capture_output: bool = True) -> s
     )
 
 
+def run_quiet(cmd: List[str], check: bool = True, input: Optional[str] = None) -> subprocess.CompletedProcess:
+    """
+    Run a command whose stdout is not needed.
+
+    stdout is discarded instead of buffered; stderr is still captured so that
+    failures (and CalledProcessError.stderr) carry the error message.
+
+    Args:
+        cmd: Command to run as list of strings
+        check: Raise exception on non-zero exit code
+        input: Text to send to stdin
+
+    Returns:
+        CompletedProcess instance
+    """
+    return subprocess.run(
+        cmd,
+        check=check,
+        input=input,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+
+def stream_command(cmd: List[str], prefix: str) -> Tuple[int, float]:
+    """
+    Run a command, streaming its combined stdout/stderr line by line.
+
+    Each line is tagged with the prefix and the elapsed time, so output from
+    commands running concurrently stays readable.
+
+    Args:
+        cmd: Command to run as list of strings
+        prefix: Tag printed before every output line (e.g., '[Docker]')
+
+    Returns:
+        Tuple of (returncode, elapsed_seconds)
+    """
+    start = time.monotonic()
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        bufsize=1,
+        text=True,
+        errors='replace'
+    )
+
+    try:
+        for line in process.stdout:
+            elapsed = time.monotonic() - start
+            print(f"{prefix} [{elapsed:7.1f}s] {line.rstrip()}", flush=True)
+    except BaseException:
+        # Don't leave the child running if we're interrupted
+        process.terminate()
+        process.wait()
+        raise
+
+    returncode = process.wait()
+    return returncode, time.monotonic() - start
+
+
+def refresh_sudo() -> bool:
+    """
+    Validate and cache sudo credentials up front.
+
+    Later sudo invocations reuse the cached timestamp instead of each going
+    through authentication.
+
+    Returns:
+        True if sudo credentials are valid
+    """
+    return subprocess.run(['sudo', '-v']).returncode == 0
+
+
+class NerdctlSession:
+    """
+    Share cached sudo credentials across nerdctl/ctr operations.
+
+    Entering the session validates sudo credentials once, so later calls reuse
+    the cached timestamp; each operation still starts its own process.
+    Operations that take IDs pass all of them to a single invocation (chunked
+    to REMOVE_BATCH_SIZE) instead of one per ID. Containers and images live in
+    the containerd namespace, so listing and removal do not depend on the
+    snapshotter.
+    """
+
+    def __enter__(self):
+        refresh_sudo()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    @staticmethod
+    def _nerdctl(snapshotter: Optional[str] = None) -> List[str]:
+        """Base nerdctl command, optionally pinned to a snapshotter."""
+        cmd = ['sudo', 'nerdctl']
+        if snapshotter:
+            cmd.extend(['--snapshotter', snapshotter])
+        return cmd
+
+    def ps(self) -> List[str]:
+        """
+        List all container IDs, including stopped containers.
+
+        Returns:
+            Container IDs
+        """
+        result = subprocess.run(
+            self._nerdctl() + ['ps', '-a', '-q'],
+            capture_output=True,
+            text=True
+        )
+        return result.stdout.split()
+
+    def rm(self, container_ids: List[str]):
+        """
+        Force-remove containers.
+
+        Args:
+            container_ids: Container IDs to remove
+        """
+        for batch in _batched(container_ids, REMOVE_BATCH_SIZE):
+            run_quiet(self._nerdctl() + ['rm', '-f'] + batch, check=False)
+
+    def images(self) -> List[str]:
+        """
+        List all image references.
+
+        Returns:
+            Image references
+        """
+        result = subprocess.run(
+            ['sudo', 'ctr', 'images', 'ls', '-q'],
+            capture_output=True,
+            text=True
+        )
+        return result.stdout.split()
+
+    def rmi(self, image_refs: List[str]):
+        """
+        Remove images.
+
+        Args:
+            image_refs: Image references to remove
+        """
+        for batch in _batched(image_refs, REMOVE_BATCH_SIZE):
+            run_quiet(['sudo', 'ctr', 'images', 'rm'] + batch, check=False)
+
+    def pull(self, image: str, snapshotter: Optional[str] = None):
+        """
+        Pull an image.
+
+        Args:
+            image: Image reference
+            snapshotter: Snapshotter to unpack for (default: nerdctl default)
+
+        Raises:
+            subprocess.CalledProcessError: If the pull fails
+        """
+        run_quiet(self._nerdctl(snapshotter) + ['pull', image])
+
+    def convert(self, source_image: str, target_image: str, options: List[str], prefix: str = '[nerdctl]'):
+        """
+        Convert a local image with `nerdctl image convert`, streaming progress.
+
+        Args:
+            source_image: Local image reference
+            target_image: Reference for the converted image
+            options: Conversion flags (e.g., ['--estargz', '--oci'])
+            prefix: Log prefix
+
+        Raises:
+            subprocess.CalledProcessError: If the conversion fails
+        """
+        cmd = self._nerdctl() + ['image', 'convert'] + options + [source_image, target_image]
+        returncode, _ = stream_command(cmd, prefix)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+
+    def tag(self, source_image: str, target_image: str, snapshotter: Optional[str] = None):
+        """
+        Tag an image.
+
+        Raises:
+            subprocess.CalledProcessError: If tagging fails
+        """
+        run_quiet(self._nerdctl(snapshotter) + ['tag', source_image, target_image])
+
+    def push(self, image: str, snapshotter: Optional[str] = None, prefix: str = '[nerdctl]'):
+        """
+        Push an image, streaming progress tagged with prefix.
+
+        Raises:
+            subprocess.CalledProcessError: If the push fails
+        """
+        cmd = self._nerdctl(snapshotter) + ['push', image]
+        returncode, _ = stream_command(cmd, prefix)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _batched(items: List[str], size: int) -> Iterator[List[str]]:
+    """
+    Split items into consecutive lists of at most size elements.
+
+    Args:
+        items: Items to split
+        size: Maximum batch size
+
+    Returns:
+        Iterator over batches
+    """
+    it = iter(items)
+    batch = list(islice(it, size))
+    while batch:
+        yield batch
+        batch = list(islice(it, size))
+
+
+@lru_cache(maxsize=None)
+def get_nerdctl_version() -> Optional[Tuple[int, ...]]:
+    """
+    Get the installed nerdctl version, probed once per process.
+
+    Returns:
+        Version tuple (e.g., (1, 7, 3)) or None if unavailable
+    """
+    try:
+        result = subprocess.run(['nerdctl', '--version'], check=True, capture_output=True, text=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+    match = re.search(r'(\d+)\.(\d+)\.(\d+)', result.stdout)
+    if not match:
+        return None
+    return tuple(int(part) for part in match.groups())
+
+
 def get_snapshotter_binary(snapshotter: str) -> str:
     """
     Get the appropriate binary for the snapshotter.
@@ -100,13 +457,120 @@ def get_snapshotter_binary(snapshotter: str) -> str:
     return 'nerdctl'
 
 
+def cached_probe(key: str, ttl_seconds: float, fn: Callable[[], Any]) -> Any:
+    """
+    Return a probe result cached across invocations in PROBE_CACHE_PATH.
+
+    The cache file is locked while the probe runs, so concurrent fastpull
+    processes wait for one probe instead of all running it. Falsy results
+    (failed probes) are returned but not cached.
+
+    Args:
+        key: Cache key, including anything the result depends on
+        ttl_seconds: Maximum age of a cached result
+        fn: Probe to run on a cache miss
+
+    Returns:
+        Cached or freshly probed value
+    """
+    try:
+        os.makedirs(os.path.dirname(PROBE_CACHE_PATH), exist_ok=True)
+        fd = os.open(PROBE_CACHE_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError:
+        # Unwritable cache directory: probe uncached
+        return fn()
+
+    with os.fdopen(fd, 'r+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            entries = json.load(f)
+        except ValueError:
+            entries = {}
+        if not isinstance(entries, dict):
+            entries = {}
+
+        # Malformed entries count as misses and are overwritten
+        entry = entries.get(key)
+        if isinstance(entry, dict) and 'value' in entry \
+                and time.time() - entry.get('ts', 0) < ttl_seconds:
+            return entry['value']
+
+        value = fn()
+        if value:
+            entries[key] = {'value': value, 'ts': time.time()}
+            f.seek(0)
+            f.truncate()
+            json.dump(entries, f)
+        return value
+
+
+def clear_probe_cache():
+    """Discard all cached probe results."""
+    try:
+        os.remove(PROBE_CACHE_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def _get_boto_session():
+    """
+    Get the shared boto3 session, creating it on first use.
+
+    boto3 is imported here rather than at module load, so commands that never
+    touch AWS don't pay for the import.
+
+    Returns:
+        boto3 Session, or None if boto3 is not installed
+    """
+    global _boto_session
+    if _boto_session is None:
+        try:
+            import boto3
+        except ImportError:  # Optional: fall back to the aws CLI
+            return None
+        _boto_session = boto3.session.Session()
+    return _boto_session
+
+
+def _aws_context() -> str:
+    """
+    Identify the AWS credentials and region selected by the environment.
+
+    Hashed, so credentials never end up in the cache file.
+
+    Returns:
+        Short hex digest of the AWS_CONTEXT_VARS values
+    """
+    values = '\0'.join(os.environ.get(name, '') for name in _AWS_CONTEXT_VARS)
+    return hashlib.sha256(values.encode()).hexdigest()[:16]
+
+
 def get_aws_account_id() -> Optional[str]:
     """
-    Get AWS account ID from AWS CLI.
+    Get AWS account ID, cached per AWS environment (see _aws_context) for PROBE_CACHE_TTL.
+
+    Returns:
+        Account ID or None if failed
+    """
+    key = f"aws.account_id:{_aws_context()}"
+    return cached_probe(key, PROBE_CACHE_TTL, _probe_aws_account_id)
+
+
+def _probe_aws_account_id() -> Optional[str]:
+    """
+    Get AWS account ID, via boto3 if installed or the AWS CLI otherwise.
 
     Returns:
         Account ID or None if failed
     """
+    session = _get_boto_session()
+    if session is not None:
+        from botocore.exceptions import BotoCoreError, ClientError
+        try:
+            return session.client('sts').get_caller_identity()['Account']
+        except (BotoCoreError, ClientError):
+            return None
+
     try:
         result = subprocess.run(
             ['aws', 'sts', 'get-caller-identity', '--query', 'Account', '--output', 'text'],
@@ -121,11 +585,32 @@ def get_aws_account_id() -> Optional[str]:
 
 def get_aws_region() -> Optional[str]:
     """
-    Get AWS region from AWS CLI configuration.
+    Get AWS region, cached per AWS environment (see _aws_context) for PROBE_CACHE_TTL.
+
+    A region set through AWS_REGION or AWS_DEFAULT_REGION wins over the cache.
 
     Returns:
         Region or None if failed
     """
+    region = os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION')
+    if region:
+        return region
+
+    key = f"aws.region:{_aws_context()}"
+    return cached_probe(key, PROBE_CACHE_TTL, _probe_aws_region)
+
+
+def _probe_aws_region() -> Optional[str]:
+    """
+    Get AWS region from the AWS configuration, via boto3 if installed.
+
+    Returns:
+        Region or None if failed
+    """
+    session = _get_boto_session()
+    if session is not None:
+        return session.region_name
+
     try:
         result = subprocess.run(
             ['aws', 'configure', 'get', 'region'],
@@ -137,3 +622,59 @@ def get_aws_region() -> Optional[str]:
         return region if region else None
     except (subprocess.CalledProcessError, FileNotFoundError):
         return None
+
+
+def get_gcloud_project() -> Optional[str]:
+    """
+    Get the active gcloud project, cached per gcloud configuration.
+
+    Returns:
+        Project ID or None if failed
+    """
+    key = f"gcloud.project:{os.environ.get('CLOUDSDK_ACTIVE_CONFIG_NAME', 'default')}"
+    return cached_probe(key, PROBE_CACHE_TTL, _probe_gcloud_project)
+
+
+def _probe_gcloud_project() -> Optional[str]:
+    """
+    Get the active gcloud project from the gcloud CLI.
+
+    Returns:
+        Project ID or None if failed
+    """
+    try:
+        result = subprocess.run(
+            ['gcloud', 'config', 'get', 'project'],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+        project = result.stdout.strip()
+        return project if project else None
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def get_ecr_credentials(region: str) -> Optional[Tuple[str, str]]:
+    """
+    Get ECR registry credentials in-process via boto3.
+
+    Args:
+        region: AWS region of the registry
+
+    Returns:
+        Tuple of (username, password) or None if boto3 is unavailable or failed
+    """
+    session = _get_boto_session()
+    if session is None:
+        return None
+
+    from botocore.exceptions import BotoCoreError, ClientError
+    try:
+        ecr = session.client('ecr', region_name=region)
+        token = ecr.get_authorization_token()['authorizationData'][0]['authorizationToken']
+    except (BotoCoreError, ClientError, KeyError, IndexError):
+        return None
+
+    username, password = base64.b64decode(token).decode().split(':', 1)
+    return username, password
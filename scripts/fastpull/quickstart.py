@@ -6,6 +6,10 @@ import argparse
 import subprocess
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import common
 
 
 # Workload configurations: (name, base_image, endpoint)
@@ -29,6 +33,8 @@ def add_parser(subparsers):
     for workload in WORKLOADS:
         wp = subparsers_qs.add_parser(workload, help=f'Benchmark {WORKLOADS[workload][0]} (nydus vs overlayfs)')
         wp.add_argument('--output-dir', help='Directory to save results')
+        wp.add_argument('--parallel', action='store_true',
+                        help='Run both modes at once on separate GPUs (needs at least 2 GPUs)')
         wp.set_defaults(func=run_quickstart)
 
     parser.set_defaults(func=lambda args: parser.print_help() if not args.workload else None)
@@ -43,28 +49,46 @@ def run_quickstart(args):
 
     base = f"public.ecr.aws/s6z9f6e5/tensorfuse/fastpull/{image_name}:latest"
 
-    for mode in ['nydus', 'normal']:
-        print(f"\n[{mode.upper()}] Starting benchmark...")
-
-        # Use fastpull command directly (works when installed via pip)
-        cmd = [
-            'fastpull', 'run',
-            '--mode', mode,
-            '--benchmark-mode', 'readiness',
-            '--readiness-endpoint', f'http://localhost:8080{endpoint}',
-            '-p', '8080:8000',
-            '--gpus', 'all',
-            base  # Image as positional argument (tag suffix added automatically by run command)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    parallel = args.parallel
+    if parallel and count_gpus() < 2:
+        # Both workloads need a whole GPU; sharing one would OOM or skew timings
+        print("Warning: --parallel needs at least 2 GPUs, running modes one at a time")
+        parallel = False
+
+    if parallel:
+        # One GPU and one host port per mode so the runs don't collide
+        runs = [
+            ('nydus', 8080, 'device=0'),
+            ('normal', 8081, 'device=1'),
         ]
-
-        if args.output_dir:
-            os.makedirs(args.output_dir, exist_ok=True)
-            cmd.extend(['--output-json', f'{args.output_dir}/{image_name}-{mode}.json'])
-
-        try:
-            subprocess.run(cmd, check=True)
-        except (subprocess.CalledProcessError, KeyboardInterrupt):
+        with ThreadPoolExecutor(max_workers=len(runs)) as executor:
+            futures = [
+                executor.submit(run_mode, args, base, image_name, endpoint, mode, port, gpus, True)
+                for mode, port, gpus in runs
+            ]
+            try:
+                results = [future.result() for future in futures]
+            except KeyboardInterrupt:
+                sys.exit(1)
+        if not all(ok for ok, _ in results):
             sys.exit(1)
+    else:
+        results = []
+        for mode in ['nydus', 'normal']:
+            try:
+                ok, events = run_mode(args, base, image_name, endpoint, mode, 8080, 'all')
+            except KeyboardInterrupt:
+                sys.exit(1)
+            if not ok:
+                if any(event['event'] == 'benchmark.timeout' for event in events):
+                    print(f"[{mode.upper()}] Timed out, skipping remaining runs")
+                sys.exit(1)
+            results.append((ok, events))
+
+    print_comparison([_find_event(events, 'benchmark.summary') for _, events in results])
 
     print(f"\n{'='*60}\nBenchmark complete!")
     if args.output_dir:
@@ -79,3 +103,115 @@ def run_quickstart(args):
     except Exception as e:
         print(f"Warning: Cleanup had issues: {e}")
     print("Cleanup complete!\n")
+
+
+def run_mode(args, base: str, image_name: str, endpoint: str, mode: str, port: int, gpus: str,
+             prefix_output: bool = False) -> Tuple[bool, List[Dict[str, Any]]]:
+    """
+    Run one benchmark mode via `fastpull run`.
+
+    Args:
+        args: Parsed quickstart arguments
+        base: Base image reference
+        image_name: Workload image name (for result file names)
+        endpoint: Readiness endpoint path
+        mode: 'nydus' or 'normal'
+        port: Host port mapped to the container's port 8000
+        gpus: Value for --gpus
+        prefix_output: Tag output lines with the mode (for concurrent runs)
+
+    Returns:
+        Tuple of (succeeded, events emitted by the run)
+    """
+    print(f"\n[{mode.upper()}] Starting benchmark...")
+
+    # Use fastpull command directly (works when installed via pip); --json makes
+    # results available as events instead of text to scrape
+    cmd = [
+        'fastpull', '--json', 'run',
+        '--mode', mode,
+        '--benchmark-mode', 'readiness',
+        '--readiness-endpoint', f'http://localhost:{port}{endpoint}',
+        '-p', f'{port}:8000',
+        '--gpus', gpus,
+        base  # Image as positional argument (tag suffix added automatically by run command)
+    ]
+
+    if args.output_dir:
+        cmd.extend(['--output-json', f'{args.output_dir}/{image_name}-{mode}.json'])
+
+    # Tag each line so concurrent runs stay readable
+    prefix = f'[{mode.upper()}] ' if prefix_output else ''
+    events = []
+
+    # Human output arrives on stderr, merged here so both stay in order
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        bufsize=1,
+        text=True,
+        errors='replace'
+    )
+    try:
+        for line in proc.stdout:
+            event = common.parse_event(line)
+            if event is None:
+                print(f"{prefix}{line}", end='', flush=True)
+                continue
+
+            events.append(event)
+            # Forward the child's events when quickstart itself runs with --json
+            fields = {k: v for k, v in event.items() if k not in ('event', 'ts')}
+            fields['mode'] = mode
+            common.emit(event['event'], **fields)
+        proc.wait()
+    except BaseException:
+        proc.terminate()
+        proc.wait()
+        raise
+
+    return proc.returncode == 0, events
+
+
+def _find_event(events: List[Dict[str, Any]], name: str) -> Optional[Dict[str, Any]]:
+    """Return the last event called name, or None."""
+    for event in reversed(events):
+        if event['event'] == name:
+            return event
+    return None
+
+
+def print_comparison(summaries: List[Optional[Dict[str, Any]]]):
+    """
+    Print FastPull vs Normal timings from the runs' benchmark.summary events.
+
+    Args:
+        summaries: benchmark.summary event of each run (None if missing)
+    """
+    metrics = {s['mode']: s['metrics'] for s in summaries if s}
+    if 'nydus' not in metrics or 'normal' not in metrics:
+        return
+
+    print(f"\n{'='*60}\n{'Metric':<24}{'FastPull':>12}{'Normal':>12}{'Speedup':>12}")
+    for key, label in [('container_start_time', 'Container Start'), ('readiness_time', 'Readiness')]:
+        fast, normal = metrics['nydus'].get(key), metrics['normal'].get(key)
+        if fast is None or normal is None:
+            continue
+        speedup = f"{normal / fast:.1f}x" if fast > 0 else '-'
+        print(f"{label:<24}{fast:>11.2f}s{normal:>11.2f}s{speedup:>12}")
+        common.emit('quickstart.comparison', metric=key, fastpull=fast, normal=normal)
+
+
+def count_gpus() -> int:
+    """
+    Count NVIDIA GPUs visible on the host.
+
+    Returns:
+        Number of GPUs, or 0 if nvidia-smi is unavailable
+    """
+    try:
+        result = subprocess.run(['nvidia-smi', '-L'], check=True, capture_output=True, text=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return 0
+    return sum(1 for line in result.stdout.splitlines() if line.startswith('GPU '))
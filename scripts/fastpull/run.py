@@ -3,16 +3,25 @@ FastPull run command - Run containers with specified snapshotters and benchmarki
 """
 
 import argparse
+import queue
 import subprocess
 import sys
 import threading
 import time
+from functools import lru_cache
 from typing import List, Optional
 
 from . import benchmark
 from . import common
 
 
+# Tag suffix of Nydus images pushed by 'fastpull build'
+_FASTPULL_SUFFIX = '-fastpull'
+
+# Container log lines buffered for printing before new ones are dropped
+LOG_QUEUE_SIZE = 1024
+
+
 def add_parser(subparsers):
     """Add run subcommand parser."""
     parser = subparsers.add_parser(
@@ -81,37 +90,50 @@ def run_command(args):
     # Determine snapshotter and modify image tag based on mode
     if args.mode == 'nydus':
         args.snapshotter = 'nydus'
-        # Add -fastpull suffix to image tag if not already present
-        if ':' in args.image:
-            base, tag = args.image.rsplit(':', 1)
-            if not tag.endswith('-fastpull'):
-                args.image = f"{base}:{tag}-fastpull"
-        else:
-            args.image = f"{args.image}:latest-fastpull"
+        args.image = _fastpull_image(args.image)
     else:  # normal mode
         args.snapshotter = 'overlayfs'
         # Use image as-is for normal mode
 
-    # Build the nerdctl/docker command
-    cmd = build_run_command(args)
+    # Build the nerdctl/docker command; benchmarking tracks a detached container
+    benchmarking = args.benchmark_mode != 'none'
+    cmd = build_run_command(args, detach_forced=benchmarking)
 
     print(f"Running container with {args.snapshotter} snapshotter...")
     print(f"Image: {args.image}")
     print(f"Command: {' '.join(cmd)}\n")
 
     # For benchmarking, we need to track the container
-    if args.benchmark_mode != 'none':
+    if benchmarking:
         run_with_benchmark(cmd, args)
     else:
         run_without_benchmark(cmd)
 
 
-def build_run_command(args) -> List[str]:
+@lru_cache(maxsize=256)
+def _fastpull_image(image: str) -> str:
+    """
+    Get the Nydus image reference for an image by adding the -fastpull tag suffix.
+
+    Args:
+        image: Image reference; the tag defaults to 'latest'
+
+    Returns:
+        Reference with the suffixed tag (unchanged if already suffixed or pinned by digest)
+    """
+    repository, tag, digest = common.split_image_ref(image)
+    if digest or tag.endswith(_FASTPULL_SUFFIX):
+        return image
+    return f"{repository}:{tag}{_FASTPULL_SUFFIX}"
+
+
+def build_run_command(args, detach_forced: bool = False) -> List[str]:
     """
     Build the nerdctl/docker run command from arguments.
 
     Args:
         args: Parsed command-line arguments
+        detach_forced: Run detached even without --detach (for benchmarking)
 
     Returns:
         Command as list of strings
@@ -129,7 +151,7 @@ def build_run_command(args) -> List[str]:
     if args.rm:
         cmd.append('--rm')
 
-    if args.detach:
+    if args.detach or detach_forced:
         cmd.append('-d')
 
     # Add ports
@@ -180,94 +202,63 @@ def run_with_benchmark(cmd: List[str], args):
     Run container with benchmarking enabled.
 
     Args:
-        cmd: Command to execute
+        cmd: Detached run command (built with detach_forced=True)
         args: Parsed arguments
     """
-    # Force detached mode for benchmarking
-    if '-d' not in cmd and '--detach' not in cmd:
-        cmd.insert(cmd.index('run') + 1, '-d')
-
     # Initialize benchmark tracker early (before starting container)
-    # We'll set container_id later, but we need to start event monitoring first
+    # The container_id is set by the tracker once the container starts
     bench = benchmark.ContainerBenchmark(
-        container_id='',  # Will be set after container starts
+        container_id='',
         benchmark_mode=args.benchmark_mode,
         readiness_endpoint=args.readiness_endpoint,
         mode=args.mode
     )
 
-    # Start event monitoring BEFORE starting the container
-    print("Starting containerd events monitoring...")
-    bench.start_event_monitoring()
-
-    # Small delay to ensure event monitoring is ready
-    time.sleep(0.5)
-
-    # Start the container
-    try:
-        print(f"Running container...")
-        result = subprocess.run(
-            cmd,
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        container_id = result.stdout.strip()
-
-        if not container_id:
-            print("Error: Failed to get container ID")
-            sys.exit(1)
+    stop_logs_event = threading.Event()
 
+    def on_start(container_id: str):
         print(f"Container started: {container_id[:12]}")
 
-        # Update benchmark tracker with container ID
-        bench.container_id = container_id
+        # Start monitoring logs in background
+        print("Monitoring container logs...")
+        start_log_monitoring(container_id, args.snapshotter, bench.start_time, stop_logs_event)
 
+    # Start event monitoring, the container, and readiness/completion polling
+    try:
+        success = bench.run(cmd, on_start=on_start)
     except subprocess.CalledProcessError as e:
-        print(f"Error starting container: {e}")
+        common.emit('run.failed', f"Error starting container: {e}", reason='start')
         if e.stderr:
             print(f"stderr: {e.stderr}")
         sys.exit(1)
-
-    # Start monitoring logs in background
-    print("Monitoring container logs...")
-    stop_logs_event = threading.Event()
-    log_thread = start_log_monitoring(container_id, args.snapshotter, bench.start_time, stop_logs_event)
-
-    # Wait for completion or readiness
-    try:
-        if args.benchmark_mode == 'completion':
-            success = bench.wait_for_completion()
-        elif args.benchmark_mode == 'readiness':
-            success = bench.wait_for_readiness()
-        else:
-            success = True
-
-        # Stop log monitoring after benchmark completes
+    except KeyboardInterrupt:
+        print("\nInterrupted by user")
         stop_logs_event.set()
+        # Stop and remove container
+        if bench.container_id:
+            cleanup_container(bench.container_id, args.snapshotter)
+        sys.exit(1)
 
-        if not success:
-            print("Benchmark failed (timeout)")
-            # Cleanup on failure
-            cleanup_container(container_id, args.snapshotter)
-            sys.exit(1)
+    # Stop log monitoring after benchmark completes
+    stop_logs_event.set()
+    container_id = bench.container_id
 
-        # Print summary
-        bench.print_summary()
+    if not success:
+        common.emit('run.failed', "Benchmark failed (timeout)", reason='timeout')
+        # Cleanup on failure
+        cleanup_container(container_id, args.snapshotter)
+        sys.exit(1)
 
-        # Export JSON if requested
-        if args.output_json:
-            bench.export_json(args.output_json)
+    # Print summary
+    bench.print_summary()
 
-        # Cleanup container after successful benchmark
-        print("\nBenchmark complete, cleaning up container...")
-        cleanup_container(container_id, args.snapshotter)
+    # Export JSON if requested
+    if args.output_json:
+        bench.export_json(args.output_json)
 
-    except KeyboardInterrupt:
-        print("\nInterrupted by user")
-        # Stop and remove container
-        cleanup_container(container_id, args.snapshotter)
-        sys.exit(1)
+    # Cleanup container after successful benchmark
+    print("\nBenchmark complete, cleaning up container...")
+    cleanup_container(container_id, args.snapshotter)
 
 
 def start_log_monitoring(container_id: str, snapshotter: str, start_time: float, stop_event: threading.Event) -> threading.Thread:
@@ -283,17 +274,33 @@ def start_log_monitoring(container_id: str, snapshotter: str, start_time: float,
     Returns:
         Log monitoring thread
     """
+    # Reader and printer are decoupled so a slow terminal never stalls the pipe;
+    # items are (elapsed, line, lines dropped just before this one), None ends
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+    def log_printer():
+        while True:
+            item = log_queue.get()
+            if item is None:
+                break
+            elapsed, line, dropped = item
+            if dropped:
+                print(f"[{elapsed:.3f}s] ... {dropped} log lines dropped")
+            print(f"[{elapsed:.3f}s] {line.rstrip()}")
+
     def log_reader():
+        dropped = 0
         try:
             cmd = ['sudo', 'nerdctl', 'logs', '-f', container_id]
 
+            # Block-buffered: each read() drains whatever the pipe holds (up to
+            # 64 KiB) instead of one syscall per line; lines are split in Python
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
                 text=True,
-                bufsize=1,
-                universal_newlines=True
+                bufsize=65536
             )
 
             for line in process.stdout:
@@ -301,12 +308,19 @@ def start_log_monitoring(container_id: str, snapshotter: str, start_time: float,
                     process.terminate()
                     break
                 if line:
-                    elapsed = time.time() - start_time
-                    print(f"[{elapsed:.3f}s] {line.rstrip()}")
+                    elapsed = time.monotonic() - start_time
+                    try:
+                        log_queue.put_nowait((elapsed, line, dropped))
+                        dropped = 0
+                    except queue.Full:
+                        dropped += 1
 
         except Exception as e:
             pass  # Silently handle errors (container might be stopped)
+        finally:
+            log_queue.put(None)
 
+    threading.Thread(target=log_printer, daemon=True).start()
     thread = threading.Thread(target=log_reader, daemon=True)
     thread.start()
     return thread
@@ -321,5 +335,5 @@ def cleanup_container(container_id: str, snapshotter: str):
         snapshotter: Snapshotter type
     """
     print(f"Cleaning up container {container_id[:12]}...")
-    subprocess.run(['sudo', 'nerdctl', 'stop', container_id], capture_output=True)
-    subprocess.run(['sudo', 'nerdctl', 'rm', container_id], capture_output=True)
+    common.run_quiet(['sudo', 'nerdctl', 'stop', container_id], check=False)
+    common.run_quiet(['sudo', 'nerdctl', 'rm', container_id], check=False)
@@ -6,9 +6,18 @@ Installs containerd, Nydus snapshotter, and FastPull CLI via pip.
 """
 
 import argparse
+import functools
+import hashlib
+import json
 import os
+import shutil
+import stat
 import subprocess
 import sys
+import tarfile
+import tempfile
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -16,15 +25,147 @@ PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
 VENV_PATH = os.path.join(PROJECT_ROOT, '.venv')
 FASTPULL_BIN = '/usr/local/bin/fastpull'
 
+NERDCTL_PATH = '/usr/local/bin/nerdctl'
+NYDUS_GRPC_PATH = '/usr/local/bin/containerd-nydus-grpc'
+
+NERDCTL_VERSION = "1.7.3"
+NYDUS_SNAPSHOTTER_VERSION = "0.15.3"
+NYDUS_VERSION = "v2.3.6"
+
+# Release archives, downloaded concurrently before anything is installed
+DOWNLOADS = {
+    'nerdctl': (
+        f"https://github.com/containerd/nerdctl/releases/download/v{NERDCTL_VERSION}/"
+        f"nerdctl-full-{NERDCTL_VERSION}-linux-amd64.tar.gz"
+    ),
+    'nydus-snapshotter': (
+        f"https://github.com/containerd/nydus-snapshotter/releases/download/v{NYDUS_SNAPSHOTTER_VERSION}/"
+        f"nydus-snapshotter-v{NYDUS_SNAPSHOTTER_VERSION}-linux-amd64.tar.gz"
+    ),
+    'nydus': (
+        f"https://github.com/dragonflyoss/nydus/releases/download/{NYDUS_VERSION}/"
+        f"nydus-static-{NYDUS_VERSION}-linux-amd64.tgz"
+    ),
+}
+
+# Checksum files each release publishes next to its archives
+CHECKSUM_URLS = {
+    'nerdctl': f"https://github.com/containerd/nerdctl/releases/download/v{NERDCTL_VERSION}/SHA256SUMS",
+    'nydus-snapshotter': DOWNLOADS['nydus-snapshotter'] + '.sha256sum',
+    'nydus': DOWNLOADS['nydus'] + '.sha256sum',
+}
+
+# Archive name -> SHA256 of every release archive installed on this host
+INSTALLED_MANIFEST_PATH = '/var/lib/fastpull/installed.json'
+
+# Release archives making up each component, and the binary that shows it is present
+COMPONENTS = {
+    'containerd': (['nerdctl'], NERDCTL_PATH),
+    'nydus': (['nydus-snapshotter', 'nydus'], NYDUS_GRPC_PATH),
+}
+
+# Fingerprint of the last fully applied containerd/Nydus setup
+SETUP_MARKER_PATH = '/var/lib/fastpull/.setup-done'
+
+# Downloaded release archives, kept across runs and reinstalls
+DOWNLOAD_CACHE_DIR = '/var/cache/fastpull/downloads'
+
+# Read size for hashing, downloading and stream-extracting archives
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Nydus tools installed from the nydus-static archive
+NYDUS_TOOLS = ['nydusd', 'nydus-image', 'nydusify']
+
+NYDUS_SERVICE_PATH = '/etc/systemd/system/fastpull.service'
+NYDUSD_CONFIG_PATH = '/etc/nydus/nydusd-config.fusedev.json'
+
+NYDUS_SERVICE_UNIT = f"""[Unit]
+Description=nydus snapshotter (fuse mode)
+After=network.target
+
+[Service]
+Type=simple
+ExecStart={NYDUS_GRPC_PATH} --nydusd-config {NYDUSD_CONFIG_PATH}
+Restart=always
+StandardOutput=journal
+StandardError=journal
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+NYDUSD_CONFIG = """{
+  "device": {
+    "backend": {
+      "type": "registry",
+      "config": {
+        "timeout": 5,
+        "connect_timeout": 5,
+        "retry_limit": 2
+      }
+    },
+    "cache": {
+      "type": "blobcache"
+    }
+  },
+  "mode": "direct",
+  "digest_validate": false,
+  "iostats_files": false,
+  "enable_xattr": true,
+  "amplify_io": 10485760,
+  "fs_prefetch": {
+    "enable": true,
+    "threads_count": 16,
+    "merging_size": 1048576,
+    "prefetch_all": true
+  }
+}
+"""
+
+CONTAINERD_CONFIG_PATH = '/etc/containerd/config.toml'
+
+# containerd [proxy_plugins] stanza for each snapshotter running as a proxy
+_PROXY_PLUGIN_TEMPLATES = {
+    'nydus': """  [proxy_plugins.nydus]
+    type = "snapshot"
+    address = "/run/containerd-nydus/containerd-nydus-grpc.sock"
+""",
+}
+
+_CRI_CONFIG_TEMPLATE = """
+[plugins."io.containerd.grpc.v1.cri".containerd]
+  snapshotter = "{snapshotter}"
+  disable_snapshot_annotations = false
+"""
+
+# Environment for installer commands, which must never wait for input
+NONINTERACTIVE_ENV = {**os.environ, 'DEBIAN_FRONTEND': 'noninteractive'}
+
+# pip caches kept across installs: HTTP/wheel cache, and wheels for offline installs
+PIP_CACHE_DIR = '/var/cache/fastpull/pip'
+WHEEL_CACHE_DIR = '/var/cache/fastpull/wheels'
+PIP_ENV = {**NONINTERACTIVE_ENV, 'PIP_CACHE_DIR': PIP_CACHE_DIR}
+
+# Build requirements of the fastpull package (keep in sync with pyproject.toml);
+# it has no runtime dependencies, so these are all an offline install needs
+CLI_BUILD_REQUIREMENTS = ['setuptools>=61.0', 'wheel']
+
+
+def run_command(cmd, check=True, capture_output=False, quiet=False, env=None):
+    """Run an argv command non-interactively (stdin is /dev/null) and return result."""
+    # quiet discards stdout but still captures stderr for error messages;
+    # env replaces NONINTERACTIVE_ENV, so start from it
+    assert isinstance(cmd, list), "run_command takes an argv list"
+
+    if quiet:
+        streams = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.PIPE}
+    else:
+        streams = {'capture_output': capture_output}
+    streams['stdin'] = subprocess.DEVNULL
+    streams['env'] = env if env is not None else NONINTERACTIVE_ENV
 
-def run_command(cmd, check=True, capture_output=False, shell=False):
-    """Run a command and return result."""
     try:
-        if shell:
-            result = subprocess.run(cmd, shell=True, check=check, capture_output=capture_output, text=True)
-        else:
-            result = subprocess.run(cmd, check=check, capture_output=capture_output, text=True)
-        return result
+        return subprocess.run(cmd, check=check, text=True, **streams)
     except subprocess.CalledProcessError as e:
         if not check:
             return e
@@ -47,26 +188,26 @@ def detect_package_manager():
 
 
 def install_system_dependencies():
-    """Install required system packages (python3-venv, wget)."""
+    """Install required system packages (python3-venv)."""
     pkg_mgr = detect_package_manager()
 
     if not pkg_mgr:
         print("⚠ Warning: Could not detect package manager (apt/yum/dnf)")
-        print("Please manually install: python3-venv, wget")
+        print("Please manually install: python3-venv")
         return False
 
     print(f"Detected package manager: {pkg_mgr}")
-    print("Installing system dependencies (python3-venv, wget)...")
+    print("Installing system dependencies (python3-venv)...")
 
     try:
         if pkg_mgr == 'apt':
             # Update package list and install dependencies
             run_command(['apt-get', 'update', '-qq'], check=True)
-            run_command(['apt-get', 'install', '-y', 'python3-venv', 'wget'], check=True)
+            run_command(['apt-get', 'install', '-y', 'python3-venv'], check=True)
         elif pkg_mgr == 'yum':
-            run_command(['yum', 'install', '-y', 'python3-venv', 'wget'], check=True)
+            run_command(['yum', 'install', '-y', 'python3-venv'], check=True)
         elif pkg_mgr == 'dnf':
-            run_command(['dnf', 'install', '-y', 'python3-venv', 'wget'], check=True)
+            run_command(['dnf', 'install', '-y', 'python3-venv'], check=True)
 
         print("✓ System dependencies installed")
         return True
@@ -75,6 +216,225 @@ def install_system_dependencies():
         return False
 
 
+def file_sha256(path):
+    """Return the hex SHA256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def published_sha256(name):
+    """Return the published SHA256 of a DOWNLOADS archive, or None if it can't be fetched."""
+    archive = os.path.basename(DOWNLOADS[name])
+    try:
+        with urllib.request.urlopen(CHECKSUM_URLS[name], timeout=30) as response:
+            lines = response.read().decode().splitlines()
+    except (OSError, ValueError):
+        return None
+
+    # "<digest>  <file>" lines; a per-archive checksum file may hold just the digest
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 1 or (fields and os.path.basename(fields[-1].lstrip('*')) == archive):
+            return fields[0].lower()
+    return None
+
+
+def cached_archive(name):
+    """Return the cached archive for a DOWNLOADS key if its SHA256 still matches, else None."""
+    path = os.path.join(DOWNLOAD_CACHE_DIR, os.path.basename(DOWNLOADS[name]))
+    try:
+        expected = published_sha256(name)
+        if expected is None:
+            # Offline: fall back to the digest verified when the archive was downloaded
+            with open(path + '.sha256') as f:
+                expected = f.read().strip()
+        if file_sha256(path) == expected:
+            return path
+    except OSError:
+        pass
+    return None
+
+
+def extract_tar(archive, extract_to):
+    """Extract an open tarfile, applying the 'tar' filter where supported."""
+    # 'tar' rejects absolute and escaping paths; 'data' would also reject nerdctl-full's symlinks
+    if hasattr(tarfile, 'tar_filter'):
+        archive.extractall(path=extract_to, filter='tar')
+    else:
+        archive.extractall(path=extract_to)
+
+
+class _TeeReader:
+    """File-like wrapper that copies everything read from a stream into a file and a digest."""
+
+    def __init__(self, stream, sink, digest):
+        self.stream = stream
+        self.sink = sink
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.digest.update(data)
+        self.sink.write(data)
+        return data
+
+    def drain(self):
+        """Copy whatever the consumer left unread (e.g., tar end-of-archive padding)."""
+        for _ in iter(lambda: self.read(STREAM_CHUNK_SIZE), b''):
+            pass
+
+
+def download_and_extract(name, extract_to):
+    """Extract a DOWNLOADS archive into extract_to through the download cache."""
+    # On a miss the response is extracted while it is copied into the cache; on a
+    # checksum mismatch this raises and the extracted files must be discarded
+    os.makedirs(extract_to, exist_ok=True)
+    url = DOWNLOADS[name]
+    archive_name = os.path.basename(url)
+
+    cached = cached_archive(name)
+    if cached:
+        print(f"  Using cached {archive_name}")
+        with tarfile.open(cached, mode='r:gz') as archive:
+            extract_tar(archive, extract_to)
+        return
+
+    expected = published_sha256(name)
+    if expected is None:
+        raise OSError(f"could not fetch the published SHA256 for {archive_name} from {CHECKSUM_URLS[name]}")
+
+    # Write the cache copy to a temporary file and rename, so readers never see a partial archive
+    os.makedirs(DOWNLOAD_CACHE_DIR, exist_ok=True)
+    path = os.path.join(DOWNLOAD_CACHE_DIR, archive_name)
+    fd, tmp_path = tempfile.mkstemp(dir=DOWNLOAD_CACHE_DIR, prefix=archive_name + '.')
+    try:
+        digest = hashlib.sha256()
+        with urllib.request.urlopen(url) as response, os.fdopen(fd, 'wb') as f:
+            tee = _TeeReader(response, f, digest)
+            # Read the response in large blocks instead of tarfile's default 10 KiB records
+            with tarfile.open(fileobj=tee, mode='r|gz', bufsize=STREAM_CHUNK_SIZE) as archive:
+                extract_tar(archive, extract_to)
+            tee.drain()
+        if digest.hexdigest() != expected:
+            raise OSError(f"SHA256 mismatch for {archive_name}: got {digest.hexdigest()}, expected {expected}")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    with open(path + '.sha256', 'w') as f:
+        f.write(digest.hexdigest() + '\n')
+
+
+def install_binary(src, dest_dir):
+    """Move a staged executable into dest_dir, executable by all."""
+    # Renaming over the destination (staging is on the same filesystem) replaces
+    # a running binary instead of failing with ETXTBSY
+    dest = os.path.join(dest_dir, os.path.basename(src))
+    mode = os.stat(src).st_mode
+    os.chmod(src, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.replace(src, dest)
+    return dest
+
+
+def install_tree(src_root, dest_root):
+    """Move a staged tree (on the same filesystem) over dest_root, like install_binary()."""
+    for dirpath, dirnames, filenames in os.walk(src_root):
+        dest_dir = os.path.normpath(os.path.join(dest_root, os.path.relpath(dirpath, src_root)))
+        os.makedirs(dest_dir, exist_ok=True)
+
+        # os.walk lists symlinks to directories under dirnames; move them like files
+        links = [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]
+        dirnames[:] = [name for name in dirnames if name not in links]
+        for name in links + filenames:
+            os.replace(os.path.join(dirpath, name), os.path.join(dest_dir, name))
+
+
+def systemctl(*args, check=True, capture_output=False):
+    """Run a systemctl command, discarding its output unless captured."""
+    return run_command(['systemctl'] + list(args), check=check,
+                       capture_output=capture_output, quiet=not capture_output)
+
+
+def load_installed_manifest():
+    """Read the installed archive manifest, or None if it was never written."""
+    try:
+        with open(INSTALLED_MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_component_installed(component, manifest, verify=False):
+    """Check that a component's binary exists and the manifest records its archives."""
+    # Recorded digests were checked against the published ones at download time;
+    # verify re-fetches the published digests (network) to catch re-tagged releases
+    names, binary = COMPONENTS[component]
+    if not os.path.exists(binary) or manifest is None:
+        # Without a manifest the installed version is unknown (e.g., set up by an
+        # older script), so reinstall once and record it
+        return False
+
+    for name in names:
+        recorded = manifest.get(os.path.basename(DOWNLOADS[name]))
+        if not recorded:
+            return False
+        if not verify:
+            continue
+        expected = published_sha256(name)
+        if expected is not None and recorded != expected:
+            return False
+    return True
+
+
+def record_installed(names):
+    """Add freshly installed archives to the installed manifest (best effort)."""
+    manifest = load_installed_manifest() or {}
+    for name in names:
+        archive = os.path.basename(DOWNLOADS[name])
+        try:
+            with open(os.path.join(DOWNLOAD_CACHE_DIR, archive + '.sha256')) as f:
+                manifest[archive] = f.read().strip()
+        except OSError:
+            manifest[archive] = ''
+
+    try:
+        os.makedirs(os.path.dirname(INSTALLED_MANIFEST_PATH), exist_ok=True)
+        with open(INSTALLED_MANIFEST_PATH, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    except OSError as e:
+        print(f"⚠ Could not write install manifest: {e}")
+
+
+def download_components(names, staging_dir):
+    """Download and extract archives concurrently; maps each name to its staged dir (None on failure)."""
+    staged = {}
+    if not names:
+        return staged
+
+    print(f"\nDownloading {', '.join(names)}...")
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        futures = {
+            executor.submit(download_and_extract, name, os.path.join(staging_dir, name)): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                staged[name] = os.path.join(staging_dir, name)
+                print(f"✓ Downloaded {name}")
+            except (OSError, tarfile.TarError) as e:
+                staged[name] = None
+                print(f"✗ Failed to download {name}: {e}")
+
+    return staged
+
+
 def check_root():
     """Check if running as root."""
     if os.geteuid() != 0:
@@ -82,264 +442,276 @@ def check_root():
         sys.exit(1)
 
 
-def install_containerd_nerdctl():
+def install_containerd_nerdctl(staged):
     """Install containerd and nerdctl."""
     print("\n" + "="*60)
     print("Installing Containerd & Nerdctl")
     print("="*60)
 
-    # Check if already installed
-    nerdctl_path = "/usr/local/bin/nerdctl"
-    if os.path.exists(nerdctl_path):
-        print(f"✓ nerdctl already installed at {nerdctl_path}")
-        result = run_command([nerdctl_path, "--version"], capture_output=True)
+    # Not fetched means already installed at this version
+    if 'nerdctl' not in staged:
+        print(f"✓ nerdctl already installed at {NERDCTL_PATH}")
+        result = run_command([NERDCTL_PATH, "--version"], capture_output=True)
         print(f"  {result.stdout.strip()}")
         return True
 
-    print("\nInstalling containerd and nerdctl...")
-
-    install_script = """
-set -e
-
-cd /tmp
-
-# Remove old download if exists
-rm -f /tmp/nerdctl-full.tar.gz
-
-# Download nerdctl-full
-NERDCTL_VERSION="1.7.3"
-echo "Downloading nerdctl-full ${NERDCTL_VERSION}..."
-wget -O /tmp/nerdctl-full.tar.gz https://github.com/containerd/nerdctl/releases/download/v${NERDCTL_VERSION}/nerdctl-full-${NERDCTL_VERSION}-linux-amd64.tar.gz
-
-# Extract to /usr/local
-echo "Extracting to /usr/local..."
-tar -C /usr/local -xzf /tmp/nerdctl-full.tar.gz
-
-# Enable and start containerd service
-echo "Enabling containerd service..."
-systemctl enable containerd
-systemctl start containerd
-
-# Clean up
-rm -f /tmp/nerdctl-full.tar.gz
+    staged_dir = staged.get('nerdctl')
+    if not staged_dir:
+        print("✗ Failed to install containerd: nerdctl-full download failed")
+        return False
 
-echo "✓ Containerd and nerdctl installed"
-"""
+    print("\nInstalling containerd and nerdctl...")
 
     try:
-        result = run_command(install_script, shell=True, capture_output=True)
+        # nerdctl-full is laid out relative to /usr/local; containerd is started
+        # by finalize_systemd() together with the other services
+        install_tree(staged_dir, '/usr/local')
+
         print("✓ Containerd and nerdctl installed successfully")
         return True
-    except subprocess.CalledProcessError as e:
+    except OSError as e:
         print(f"✗ Failed to install containerd: {e}")
-        if e.stdout:
-            print(f"stdout: {e.stdout}")
-        if e.stderr:
-            print(f"stderr: {e.stderr}")
         return False
 
 
-def install_nydus():
-    """Install Nydus snapshotter."""
+def install_nydus(staged):
+    """Install Nydus snapshotter; returns create_nydus_service()'s result, or None on failure."""
     print("\n" + "="*60)
     print("Installing Nydus Snapshotter")
     print("="*60)
 
-    nydus_path = "/usr/local/bin/containerd-nydus-grpc"
-    service_path = "/etc/systemd/system/fastpull.service"
-
-    # Check if binary exists
-    if os.path.exists(nydus_path):
-        print(f"✓ Nydus binary found at {nydus_path}")
-        # Always recreate service and config (to ensure latest settings)
+    # Not fetched means already installed at this version
+    if 'nydus-snapshotter' not in staged and 'nydus' not in staged:
+        print(f"✓ Nydus binary found at {NYDUS_GRPC_PATH}")
+        # Bring service and config up to date (to ensure latest settings)
         print("Updating service and configuration...")
-        create_nydus_service()
-        return True
+        return create_nydus_service()
 
-    install_script = """
-set -e
-
-NYDUS_SNAPSHOTTER_VERSION="0.15.3"
-echo "Downloading Nydus Snapshotter v${NYDUS_SNAPSHOTTER_VERSION}..."
+    snapshotter_dir = staged.get('nydus-snapshotter')
+    nydus_dir = staged.get('nydus')
+    if not snapshotter_dir or not nydus_dir:
+        print("✗ Failed to install Nydus: download failed")
+        return None
 
-# Download Nydus Snapshotter
-cd /tmp
-wget https://github.com/containerd/nydus-snapshotter/releases/download/v${NYDUS_SNAPSHOTTER_VERSION}/nydus-snapshotter-v${NYDUS_SNAPSHOTTER_VERSION}-linux-amd64.tar.gz
+    try:
+        # Snapshotter gRPC daemon
+        install_binary(os.path.join(snapshotter_dir, 'bin', 'containerd-nydus-grpc'), '/usr/local/bin')
 
-# Extract and install
-tar -xzf nydus-snapshotter-v${NYDUS_SNAPSHOTTER_VERSION}-linux-amd64.tar.gz
-cp bin/containerd-nydus-grpc /usr/local/bin/
-chmod +x /usr/local/bin/containerd-nydus-grpc
+        # Also install nydusd (required by snapshotter) and conversion tools
+        for tool in NYDUS_TOOLS:
+            install_binary(os.path.join(nydus_dir, 'nydus-static', tool), '/usr/local/bin')
 
-# Also install nydusd (required by snapshotter)
-NYDUS_VERSION="v2.3.6"
-echo "Downloading Nydus tools ${NYDUS_VERSION}..."
-wget -O nydus.tgz https://github.com/dragonflyoss/nydus/releases/download/${NYDUS_VERSION}/nydus-static-${NYDUS_VERSION}-linux-amd64.tgz
-tar xzf nydus.tgz
-cp nydus-static/nydusd /usr/local/bin/
-cp nydus-static/nydus-image /usr/local/bin/
-cp nydus-static/nydusify /usr/local/bin/
-chmod +x /usr/local/bin/nydusd /usr/local/bin/nydus-image /usr/local/bin/nydusify
+        print("✓ Nydus binaries installed successfully")
 
-# Clean up
-rm -rf bin nydus-snapshotter-v${NYDUS_SNAPSHOTTER_VERSION}-linux-amd64.tar.gz nydus-static nydus.tgz
+        # Now create the service (shared code)
+        return create_nydus_service()
+    except OSError as e:
+        print(f"✗ Failed to install Nydus: {e}")
+        return None
 
-echo "✓ Nydus binaries installed"
-"""
 
+def write_if_changed(path, content):
+    """Write a file only if its content differs; returns True if written."""
     try:
-        result = run_command(install_script, shell=True, capture_output=True)
-        print("✓ Nydus binaries installed successfully")
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
 
-        # Now create the service (shared code)
-        create_nydus_service()
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"✗ Failed to install Nydus: {e}")
-        if e.stderr:
-            print(f"stderr: {e.stderr}")
-        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+    return True
 
 
 def create_nydus_service():
-    """Create systemd service for Nydus snapshotter."""
-    service_script = """
-# Create systemd service
-cat > /etc/systemd/system/fastpull.service <<'EOF'
-[Unit]
-Description=nydus snapshotter (fuse mode)
-After=network.target
+    """Write the Nydus unit (and config if missing); returns which changed, or None on failure."""
+    try:
+        os.makedirs('/var/lib/nydus/cache', exist_ok=True)
+        changes = {'unit': write_if_changed(NYDUS_SERVICE_PATH, NYDUS_SERVICE_UNIT), 'config': False}
+
+        # Create Nydus config if it doesn't exist; an existing one may carry admin tuning
+        if not os.path.exists(NYDUSD_CONFIG_PATH):
+            write_if_changed(NYDUSD_CONFIG_PATH, NYDUSD_CONFIG)
+            changes['config'] = True
+    except OSError as e:
+        print(f"✗ Failed to create service: {e}")
+        return None
 
-[Service]
-Type=simple
-ExecStart=/usr/local/bin/containerd-nydus-grpc --nydusd-config /etc/nydus/nydusd-config.fusedev.json
-Restart=always
-StandardOutput=journal
-StandardError=journal
+    if any(changes.values()):
+        print("✓ Created fastpull.service")
+    else:
+        print("✓ fastpull.service is up to date")
+    return changes
 
-[Install]
-WantedBy=multi-user.target
-EOF
 
-# Create necessary directories
-mkdir -p /etc/nydus
-mkdir -p /var/lib/nydus/cache
+def render_containerd_config(snapshotters, default_snapshotter):
+    """Render containerd's config.toml from the proxy plugin templates."""
+    fragments = ''.join(
+        _PROXY_PLUGIN_TEMPLATES[name] for name in snapshotters if name in _PROXY_PLUGIN_TEMPLATES
+    )
+    return (
+        "version = 2\n\n[proxy_plugins]\n" + fragments
+        + _CRI_CONFIG_TEMPLATE.format(snapshotter=default_snapshotter)
+    )
 
-# Create Nydus config if it doesn't exist
-if [ ! -f /etc/nydus/nydusd-config.fusedev.json ]; then
-cat > /etc/nydus/nydusd-config.fusedev.json <<'EOF'
-{
-  "device": {
-    "backend": {
-      "type": "registry",
-      "config": {
-        "timeout": 5,
-        "connect_timeout": 5,
-        "retry_limit": 2
-      }
-    },
-    "cache": {
-      "type": "blobcache"
-    }
-  },
-  "mode": "direct",
-  "digest_validate": false,
-  "iostats_files": false,
-  "enable_xattr": true,
-  "amplify_io": 10485760,
-  "fs_prefetch": {
-    "enable": true,
-    "threads_count": 16,
-    "merging_size": 1048576,
-    "prefetch_all": true
-  }
-}
-EOF
-fi
 
-# Enable and start service
-systemctl daemon-reload
-systemctl enable fastpull.service
-systemctl start fastpull.service
+def configure_containerd_for_nydus():
+    """Configure containerd to use Nydus snapshotter; returns True if the config changed."""
+    print("\nConfiguring containerd for Nydus...")
 
-echo "✓ Nydus service created and started"
-"""
+    config_file = CONTAINERD_CONFIG_PATH
 
-    try:
-        run_command(service_script, shell=True, capture_output=True)
-        print("✓ Created and started fastpull.service")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"✗ Failed to create service: {e}")
+    # Create containerd config with Nydus proxy plugin
+    config_content = render_containerd_config(['nydus'], default_snapshotter='nydus')
+
+    # Restarting disrupts every running container, so only do it on a change
+    if not write_if_changed(config_file, config_content):
+        print(f"✓ containerd config at {config_file} is up to date")
         return False
 
+    print(f"✓ Updated containerd config at {config_file}")
+    return True
 
-def configure_containerd_for_nydus():
-    """Configure containerd to use Nydus snapshotter."""
-    print("\nConfiguring containerd for Nydus...")
 
-    config_dir = "/etc/containerd"
-    config_file = os.path.join(config_dir, "config.toml")
+def setup_state_digest():
+    """Fingerprint the pinned versions and everything containerd/Nydus setup writes."""
+    state = '\0'.join([
+        NERDCTL_VERSION,
+        NYDUS_SNAPSHOTTER_VERSION,
+        NYDUS_VERSION,
+        NYDUS_SERVICE_UNIT,
+        NYDUSD_CONFIG,
+        render_containerd_config(['nydus'], default_snapshotter='nydus'),
+    ])
+    return hashlib.sha256(state.encode()).hexdigest()
 
-    os.makedirs(config_dir, exist_ok=True)
 
-    # Create containerd config with Nydus proxy plugin
-    config_content = """version = 2
+def is_setup_current(desired_state):
+    """Check whether a previous run already applied exactly this setup."""
+    manifest = load_installed_manifest()
+    if not all(is_component_installed(component, manifest) for component in COMPONENTS):
+        return False
+    try:
+        with open(SETUP_MARKER_PATH) as f:
+            return f.read().strip() == desired_state
+    except OSError:
+        return False
 
-[proxy_plugins]
-  [proxy_plugins.nydus]
-    type = "snapshot"
-    address = "/run/containerd-nydus/containerd-nydus-grpc.sock"
 
-[plugins."io.containerd.grpc.v1.cri".containerd]
-  snapshotter = "nydus"
-  disable_snapshot_annotations = false
-"""
+def write_setup_marker(desired_state):
+    """Record desired_state as applied (best effort)."""
+    try:
+        os.makedirs(os.path.dirname(SETUP_MARKER_PATH), exist_ok=True)
+        with open(SETUP_MARKER_PATH, 'w') as f:
+            f.write(desired_state + '\n')
+    except OSError as e:
+        print(f"⚠ Could not write setup marker: {e}")
 
-    with open(config_file, 'w') as f:
-        f.write(config_content)
 
-    print(f"✓ Updated containerd config at {config_file}")
+def finalize_systemd(units, changed_units, restart_units=()):
+    """Reload systemd, enable and start units, and bounce only running units that changed."""
+    # Config changes use reload-or-restart; unit file or binary changes need a full restart
+    print("\nStarting services...")
 
-    # Restart fastpull service first
-    print("Restarting fastpull service...")
-    run_command(["systemctl", "restart", "fastpull.service"], check=False)
+    try:
+        # One query for all units: is-active prints one state per line, in order
+        result = systemctl('is-active', *units, capture_output=True, check=False)
+        was_active = {unit for unit, state in zip(units, result.stdout.split()) if state == 'active'}
+
+        systemctl('daemon-reload')
+        systemctl('enable', '--now', *units)
+
+        running = [unit for unit in units if unit in was_active]
+        to_restart = [unit for unit in running if unit in restart_units]
+        to_reload = [unit for unit in running if unit in changed_units and unit not in to_restart]
+        if to_restart:
+            print(f"Restarting {', '.join(to_restart)}...")
+            systemctl('restart', *to_restart)
+        if to_reload:
+            print(f"Reloading {', '.join(to_reload)}...")
+            systemctl('reload-or-restart', *to_reload)
+    except subprocess.CalledProcessError as e:
+        print(f"✗ Failed to start services: {e}")
+        if e.stderr:
+            print(f"stderr: {e.stderr}")
+        return False
+    except OSError as e:
+        print(f"✗ Failed to start services: {e}")
+        return False
+
+    print(f"✓ Services running: {', '.join(units)}")
+    return True
 
-    # Then restart containerd service
-    print("Restarting containerd service...")
-    run_command(["systemctl", "restart", "containerd.service"], check=False)
 
-    print("✓ Services restarted")
+def populate_wheel_cache(venv_pip):
+    """Save the wheels needed to build fastpull, so later installs work offline (best effort)."""
+    os.makedirs(WHEEL_CACHE_DIR, exist_ok=True)
+    result = run_command(
+        [venv_pip, 'download', '--prefer-binary', '--dest', WHEEL_CACHE_DIR] + CLI_BUILD_REQUIREMENTS,
+        check=False, quiet=True, env=PIP_ENV
+    )
+    if result.returncode != 0:
+        print(f"⚠ Could not populate wheel cache: {result.stderr.strip()}")
+
+
+def ensure_venv():
+    """Create the fastpull venv if it doesn't exist. Returns True if it is usable."""
+    if os.path.exists(VENV_PATH):
+        return True
 
+    print(f"Creating virtual environment at {VENV_PATH}...")
+    result = run_command(['python3', '-m', 'venv', VENV_PATH], check=False, quiet=True)
+    if result.returncode != 0:
+        print(f"✗ Failed to create venv: {result.stderr}")
+        return False
+    print(f"✓ Created virtual environment")
     return True
 
 
-def install_cli():
-    """Install fastpull CLI via pip in a venv."""
+def prefetch_cli_wheels():
+    """Fill an empty wheel cache in the background, ahead of install_cli() (best effort)."""
+    if os.path.isdir(WHEEL_CACHE_DIR) and os.listdir(WHEEL_CACHE_DIR):
+        return
+    try:
+        if ensure_venv():
+            populate_wheel_cache(os.path.join(VENV_PATH, 'bin', 'pip'))
+    except OSError as e:
+        print(f"⚠ Could not prefetch CLI wheels: {e}")
+
+
+def install_cli(reuse_venv=False):
+    """Install fastpull CLI via pip in a venv (reuse_venv skips dependency resolution)."""
     print("\n" + "="*60)
     print("Installing FastPull CLI")
     print("="*60)
 
     try:
         # Create venv if it doesn't exist
-        if not os.path.exists(VENV_PATH):
-            print(f"Creating virtual environment at {VENV_PATH}...")
-            result = run_command(['python3', '-m', 'venv', VENV_PATH], check=False, capture_output=True)
-            if result.returncode != 0:
-                print(f"✗ Failed to create venv: {result.stderr}")
-                return False
-            print(f"✓ Created virtual environment")
+        if not ensure_venv():
+            return False
 
         # Get pip path in venv
         venv_pip = os.path.join(VENV_PATH, 'bin', 'pip')
         venv_python = os.path.join(VENV_PATH, 'bin', 'python3')
 
-        # Install fastpull in venv
+        # Install fastpull in venv, from the local wheel cache when it has
+        # everything needed, otherwise from PyPI through pip's cache
         print("Installing fastpull in virtual environment...")
-        result = run_command([venv_pip, 'install', '-e', PROJECT_ROOT], check=False, capture_output=True)
-        if result.returncode != 0:
-            print(f"✗ Failed to install in venv: {result.stderr}")
-            return False
+        install_cmd = [venv_pip, 'install', '--prefer-binary', '-e', PROJECT_ROOT]
+        if reuse_venv:
+            install_cmd.insert(2, '--no-deps')
+        result = None
+        if os.path.isdir(WHEEL_CACHE_DIR) and os.listdir(WHEEL_CACHE_DIR):
+            result = run_command(install_cmd + ['--no-index', '--find-links', WHEEL_CACHE_DIR],
+                                 check=False, quiet=True, env=PIP_ENV)
+        if result is None or result.returncode != 0:
+            result = run_command(install_cmd, check=False, quiet=True, env=PIP_ENV)
+            if result.returncode != 0:
+                print(f"✗ Failed to install in venv: {result.stderr}")
+                return False
+            populate_wheel_cache(venv_pip)
         print("✓ Installed fastpull in virtual environment")
 
         # Create wrapper script in /usr/local/bin
@@ -369,9 +741,25 @@ def verify_installation():
     print("Verifying Installation")
     print("="*60)
 
+    # A manifest entry for the pinned nerdctl-full archive already tells us its version
+    manifest = load_installed_manifest() or {}
+    nerdctl_version = None
+    if os.path.exists(NERDCTL_PATH) and os.path.basename(DOWNLOADS['nerdctl']) in manifest:
+        nerdctl_version = NERDCTL_VERSION
+
+    # The checks are independent, so start them all at once and report in order
+    units = ['containerd.service', 'fastpull.service']
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        cli_check = executor.submit(run_command, ['fastpull', '--version'], capture_output=True, check=False)
+        nerdctl_check = None
+        if os.path.exists(NERDCTL_PATH) and nerdctl_version is None:
+            nerdctl_check = executor.submit(run_command, [NERDCTL_PATH, "--version"], capture_output=True)
+        # One query for both services: is-active prints one state per line, in order
+        services_check = executor.submit(systemctl, 'is-active', *units, capture_output=True, check=False)
+
     # Test CLI
     try:
-        result = run_command(['fastpull', '--version'], capture_output=True, check=False)
+        result = cli_check.result()
         if result.returncode == 0:
             print(f"✓ fastpull CLI: {result.stdout.strip()}")
         else:
@@ -383,33 +771,29 @@ def verify_installation():
         return False
 
     # Check nerdctl
-    nerdctl_path = "/usr/local/bin/nerdctl"
-    if os.path.exists(nerdctl_path):
+    if nerdctl_version is not None:
+        print(f"✓ nerdctl: {nerdctl_version}")
+    elif nerdctl_check is not None:
         try:
-            result = run_command([nerdctl_path, "--version"], capture_output=True)
+            result = nerdctl_check.result()
             print(f"✓ nerdctl: {result.stdout.strip().split()[2]}")
         except:
             print(f"  nerdctl found but version check failed")
 
-    # Check containerd service
+    # Check containerd and FastPull services
     try:
-        result = run_command(["systemctl", "is-active", "containerd.service"], capture_output=True)
-        if result.returncode == 0:
-            print(f"✓ containerd service: active")
-        else:
-            print(f"  containerd service: {result.stdout.strip()}")
+        states = services_check.result().stdout.split()
     except:
-        print(f"  Could not check containerd service")
-
-    # Check FastPull service
-    try:
-        result = run_command(["systemctl", "is-active", "fastpull.service"], capture_output=True)
-        if result.returncode == 0:
-            print(f"✓ fastpull service: active")
+        states = []
+    if len(states) != len(units):
+        states = [None] * len(units)
+    for name, state in zip(['containerd', 'fastpull'], states):
+        if state == 'active':
+            print(f"✓ {name} service: active")
+        elif state:
+            print(f"  {name} service: {state}")
         else:
-            print(f"  fastpull service: {result.stdout.strip()}")
-    except:
-        print(f"  Could not check fastpull service")
+            print(f"  Could not check {name} service")
 
     return True
 
@@ -427,8 +811,14 @@ Examples:
   # Install only CLI (skip containerd/Nydus setup)
   sudo python3 scripts/setup.py --cli-only
 
-  # Uninstall fastpull CLI
+  # Reapply service and containerd configuration even if already set up
+  sudo python3 scripts/setup.py --force
+
+  # Uninstall fastpull CLI (keeps the venv for a fast reinstall)
   sudo python3 scripts/setup.py --uninstall
+
+  # Uninstall fastpull CLI and remove its venv
+  sudo python3 scripts/setup.py --uninstall --purge
 """
     )
     parser.add_argument(
@@ -441,6 +831,16 @@ Examples:
         action='store_true',
         help='Uninstall fastpull CLI'
     )
+    parser.add_argument(
+        '--purge',
+        action='store_true',
+        help='With --uninstall, also remove the virtual environment'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Reapply containerd/Nydus setup even if this version is already set up'
+    )
 
     args = parser.parse_args()
 
@@ -457,12 +857,14 @@ Examples:
             print(f"✓ Removed {FASTPULL_BIN}")
             removed = True
 
-        # Remove venv
+        # Remove venv only when purging; keeping it makes reinstalling fast
         if os.path.exists(VENV_PATH):
-            import shutil
-            shutil.rmtree(VENV_PATH)
-            print(f"✓ Removed virtual environment at {VENV_PATH}")
-            removed = True
+            if args.purge:
+                shutil.rmtree(VENV_PATH)
+                print(f"✓ Removed virtual environment at {VENV_PATH}")
+                removed = True
+            else:
+                print(f"  Kept virtual environment at {VENV_PATH} (use --purge to remove it)")
 
         if removed:
             print("✓ Uninstall complete")
@@ -497,24 +899,76 @@ Examples:
     success = True
     warnings = []
 
-    if not args.cli_only:
-        # Install containerd and nerdctl
-        if not install_containerd_nerdctl():
-            print("\n⚠ Warning: Containerd installation failed")
-            print("You can still install the CLI with --cli-only")
-            sys.exit(1)
-
-        # Install Nydus snapshotter
-        if not install_nydus():
-            print("\n⚠ Warning: Nydus installation failed")
+    # Fetch the CLI's build wheels while containerd/Nydus archives download
+    reuse_venv = os.path.exists(VENV_PATH)
+    prefetch = ThreadPoolExecutor(max_workers=1)
+    cli_prefetch = prefetch.submit(prefetch_cli_wheels)
+
+    desired_state = setup_state_digest()
+    if not args.cli_only and not args.force and is_setup_current(desired_state):
+        print("\n✓ containerd and Nydus already set up for this version, skipping (use --force to reapply)")
+    elif not args.cli_only:
+        # Fetch every missing or outdated component at once, then install one at a time;
+        # --force also re-checks installed archives against the published digests
+        manifest = load_installed_manifest()
+        needed = []
+        for component, (names, _) in COMPONENTS.items():
+            if not is_component_installed(component, manifest, verify=args.force):
+                needed.extend(names)
+
+        # Stage on the install filesystem so files are renamed into place rather
+        # than copied, and large trees stay out of /tmp (often tmpfs)
+        staging_dir = tempfile.mkdtemp(prefix='.fastpull-setup-', dir='/usr/local')
+        try:
+            staged = download_components(needed, staging_dir)
+
+            # Install containerd and nerdctl
+            if not install_containerd_nerdctl(staged):
+                print("\n⚠ Warning: Containerd installation failed")
+                print("You can still install the CLI with --cli-only")
+                sys.exit(1)
+            record_installed([name for name in ['nerdctl'] if name in staged])
+
+            # Install Nydus snapshotter
+            units = ['containerd.service']
+            changed_units = []
+            restart_units = []
+
+            # A running containerd keeps executing the binaries it was started from
+            if staged.get('nerdctl'):
+                restart_units.append('containerd.service')
+            nydus_changes = install_nydus(staged)
+            if nydus_changes is None:
+                print("\n⚠ Warning: Nydus installation failed")
+                success = False
+                warnings.append("Nydus snapshotter installation failed")
+            else:
+                record_installed([name for name in ['nydus-snapshotter', 'nydus'] if name in staged])
+                if nydus_changes['unit'] or staged.get('nydus-snapshotter') or staged.get('nydus'):
+                    restart_units.append('fastpull.service')
+                if nydus_changes['config']:
+                    changed_units.append('fastpull.service')
+
+                # Only configure containerd if Nydus installed successfully
+                units.insert(0, 'fastpull.service')
+                if configure_containerd_for_nydus():
+                    changed_units = list(units)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        # Reload, enable, start and restart everything at once
+        if not finalize_systemd(units, changed_units, restart_units):
             success = False
-            warnings.append("Nydus snapshotter installation failed")
-        else:
-            # Only configure containerd if Nydus installed successfully
-            configure_containerd_for_nydus()
+            warnings.append("Some services failed to start")
+
+        # Remember a fully applied setup so reruns can skip it
+        if success:
+            write_setup_marker(desired_state)
 
     # Install CLI
-    if not install_cli():
+    cli_prefetch.result()
+    prefetch.shutdown()
+    if not install_cli(reuse_venv=reuse_venv):
         print("\nSetup incomplete: CLI installation failed")
         if not args.cli_only:
             print("Note: Snapshotters may have been installed")